@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WRITERS = {
+    "pyreadstat": """
+import polars as pl, pyreadstat
+df = pl.read_parquet(source)
+try:
+    pyreadstat.write_sav(df, output, compress=zsav)
+except TypeError:
+    pyreadstat.write_sav(df.to_pandas(), output, compress=zsav)
+""",
+    "stream": """
+dtabnk.write_sav_stream(source, output, zsav=zsav)
+""",
+}
+
+CHILD_CODE = """
+import json, resource, sys, time
+sys.path.insert(0, {repo!r})
+import dtabnk
+source, output, zsav = {source!r}, {output!r}, {zsav!r}
+base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - t0
+peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "peak_rss_kb": peak_rss, "base_rss_kb": base_rss}}))
+"""
+
+
+def make_panel(path: str, countries: int, series: int, years: int) -> int:
+    sys.path.insert(0, REPO_DIR)
+    import polars as pl
+
+    rows = countries * years
+    frame = pl.DataFrame(
+        {
+            "Country": ["Economy {:03d}".format(i // years) for i in range(rows)],
+            "Year": [1960 + i % years for i in range(rows)],
+        }
+    ).with_columns(
+        [
+            (pl.int_range(0, rows) * (j + 1) % 997 / 7.0)
+            .alias("S{:04d}".format(j))
+            for j in range(series)
+        ]
+    )
+    frame.write_parquet(path)
+    return rows
+
+
+def run_writer(name: str, source: str, output: str, zsav: bool) -> Dict[str, float]:
+    code = CHILD_CODE.format(
+        repo=REPO_DIR, source=source, output=output, zsav=zsav, body=WRITERS[name]
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare .sav write throughput: pyreadstat vs dtabnk streaming writer."
+    )
+    parser.add_argument("--countries", type=int, default=265)
+    parser.add_argument("--series", type=int, default=200)
+    parser.add_argument("--years", type=int, default=64)
+    parser.add_argument("--zsav", action="store_true", help="Benchmark ZSAV output.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "panel.parquet")
+        rows = make_panel(source, args.countries, args.series, args.years)
+        print(
+            "Panel: {} rows x {} columns | zsav: {}".format(
+                rows, args.series + 2, args.zsav
+            )
+        )
+
+        for name in WRITERS:
+            output = os.path.join(tmp, "{}.sav".format(name))
+            try:
+                stats = run_writer(name, source, output, args.zsav)
+            except subprocess.CalledProcessError as exc:
+                print("{:<11} failed: {}".format(name, exc.stderr.strip()[-200:]))
+                continue
+            size_mb = os.path.getsize(output) / 1024 / 1024
+            print(
+                "{:<11} {:.2f}s | {:,.0f} rows/s | {:.1f} MB/s out | peak RSS {:.0f} MB | size {:.1f} MB".format(
+                    name,
+                    stats["seconds"],
+                    rows / max(stats["seconds"], 1e-9),
+                    size_mb / max(stats["seconds"], 1e-9),
+                    stats["peak_rss_kb"] / 1024,
+                    size_mb,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
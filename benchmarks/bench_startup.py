@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "dta": [],
+    "parquet-out": ["--parquet-out"],
+}
+
+BACKEND_MODULES = ["rpy2", "pyreadstat", "pandas", "fastexcel", "openpyxl"]
+
+CHILD_CODE = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {repo!r})
+import dtabnk
+t_import = time.perf_counter() - t0
+sys.argv = {argv!r}
+dtabnk.main()
+t_total = time.perf_counter() - t0
+print(json.dumps({{
+    "import_s": t_import,
+    "total_s": t_total,
+    "modules": {{m: m in sys.modules for m in {modules!r}}},
+}}))
+"""
+
+
+def write_sample_csv(path: str) -> None:
+    lines = [
+        '"Country Name","Country Code","Series Name","Series Code",'
+        '"2000 [YR2000]","2001 [YR2001]"'
+    ]
+    for country in ("Aruba", "Chad", "France"):
+        lines.append('"{}","{}","GDP (current US$)","NY.GDP.MKTP.CD",1.5,..'.format(
+            country, country[:3].upper()
+        ))
+    lines.extend(["", '"Data from database: World Development Indicators"'])
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write("\n".join(lines) + "\n")
+
+
+def run_once(csv_path: str, flags: List[str]) -> Dict[str, object]:
+    argv = ["dtabnk", csv_path, "--overwrite"] + flags
+    code = CHILD_CODE.format(repo=REPO_DIR, argv=argv, modules=BACKEND_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure dtabnk start-up time and which backends each run imports."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario.")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "sample.csv")
+        write_sample_csv(csv_path)
+
+        for name, flags in SCENARIOS.items():
+            runs = [run_once(csv_path, flags) for _ in range(max(1, args.repeat))]
+            loaded = sorted(m for m, hit in runs[-1]["modules"].items() if hit)
+            print(
+                "{:<12} import {:.3f}s | total {:.3f}s (median of {}) | backends: {}".format(
+                    name,
+                    statistics.median(r["import_s"] for r in runs),
+                    statistics.median(r["total_s"] for r in runs),
+                    len(runs),
+                    ", ".join(loaded) or "none",
+                )
+            )
+            if any(r["modules"]["rpy2"] for r in runs):
+                print("  FAIL: rpy2 was imported for '{}'.".format(name))
+                failed = True
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+LAYOUTS = ["wide", "wide_header_series", "long", "year_rows"]
+SOURCES = ["csv", "xlsx"]
+NO_LIMIT_MB = 10**9
+
+# (lazy threshold MB, parquet threshold MB) per read_source branch. CSV inputs
+# over the lazy threshold are streamed to a Parquet intermediate, so "lazy" and
+# "parquet" only differ for Excel inputs; the branch actually taken is reported.
+BRANCHES = {
+    "eager": (NO_LIMIT_MB, NO_LIMIT_MB),
+    "lazy": (0, NO_LIMIT_MB),
+    "parquet": (NO_LIMIT_MB, 0),
+}
+
+FOOTER = [
+    "Data from database: World Development Indicators",
+    "Last Updated: 12/16/2025",
+]
+
+CHILD_CODE = """
+import json, os, sys, time
+sys.path.insert(0, {repo!r})
+import dtabnk
+dtabnk.configure_polars()
+path, base, layout, formats = {path!r}, {base!r}, {layout!r}, {formats!r}
+dtabnk.start_profile()
+dtabnk.PROFILE_STATE["file"] = path
+with dtabnk.profile_stage("benchmark") as run:
+    t0 = time.perf_counter()
+    df = dtabnk.process_file(
+        path=path,
+        id_var="Country_Name",
+        layout=layout,
+        year_col=None,
+        value_col=None,
+        series_col=None,
+        lazy_thresh={lazy!r},
+        parquet_thresh={parquet!r},
+        min_free_ram_mb=128,
+        safe_mode=False,
+        delimiter=",",
+        header_row_override=None,
+    )
+    export_df = dtabnk.prepare_export_df(df)
+    t1 = time.perf_counter()
+    for fmt in formats:
+        dtabnk.write(export_df, base, fmt, 15, overwrite=True, min_free_ram_mb=128)
+    t2 = time.perf_counter()
+records = dtabnk.PROFILE_STATE["records"]
+branch = next(r["policy"]["branch"] for r in records if r["stage"] == "source read")
+print(json.dumps({{
+    "process_s": t1 - t0,
+    "write_s": t2 - t1,
+    "peak_rss_mb": run["rss_start_mb"] + run["peak_rss_delta_mb"],
+    "peak_rss_delta_mb": run["peak_rss_delta_mb"],
+    "policy_branch": branch,
+    "rows": export_df.height,
+    "columns": export_df.width,
+    "output_bytes": {{
+        fmt: os.path.getsize("{{}}.{{}}".format(base, fmt))
+        for fmt in formats
+        if os.path.exists("{{}}.{{}}".format(base, fmt))
+    }},
+}}))
+"""
+
+
+def synthetic_values(pl, rows: int, seed: int, missing: float):
+    return (
+        pl.when((pl.int_range(0, rows) * 7919 + seed) % 1000 < int(missing * 1000))
+        .then(pl.lit(".."))
+        .otherwise(
+            ((pl.int_range(0, rows) * (seed + 13) % 100003) / 97.0)
+            .round(3)
+            .cast(pl.Utf8)
+        )
+    )
+
+
+def make_frame(layout: str, economies: int, series: int, years: int, missing: float):
+    import polars as pl
+
+    first_year = 2025 - years + 1
+    year_range = range(first_year, first_year + years)
+    names = ["Economy {:03d}".format(i) for i in range(economies)]
+    codes = ["E{:02d}".format(i % 100) + chr(65 + i // 100 % 26) for i in range(economies)]
+    series_names = ["Indicator {:04d} (current US$)".format(j) for j in range(series)]
+    series_codes = ["IND.{:04d}.CD".format(j) for j in range(series)]
+
+    if layout == "wide":
+        rows = economies * series
+        index = pl.int_range(0, rows, eager=True)
+        frame = pl.DataFrame(
+            {
+                "Country Name": pl.Series(names).gather(index // series),
+                "Country Code": pl.Series(codes).gather(index // series),
+                "Series Name": pl.Series(series_names).gather(index % series),
+                "Series Code": pl.Series(series_codes).gather(index % series),
+            }
+        )
+        return frame.with_columns(
+            [
+                synthetic_values(pl, rows, year, missing).alias("{0} [YR{0}]".format(year))
+                for year in year_range
+            ]
+        )
+
+    if layout == "wide_header_series":
+        frame = pl.DataFrame({"Country Name": names, "Country Code": codes})
+        return frame.with_columns(
+            [
+                synthetic_values(pl, economies, year * 31 + j, missing).alias(
+                    "{0} [YR{0}] - {1} [{2}]".format(year, series_names[j], series_codes[j])
+                )
+                for j in range(series)
+                for year in year_range
+            ]
+        )
+
+    if layout == "long":
+        rows = economies * series * years
+        index = pl.int_range(0, rows, eager=True)
+        frame = pl.DataFrame(
+            {
+                "Country Name": pl.Series(names).gather(index // (series * years)),
+                "Country Code": pl.Series(codes).gather(index // (series * years)),
+                "Series Name": pl.Series(series_names).gather(index // years % series),
+                "Year": index % years + first_year,
+            }
+        )
+        return frame.with_columns(synthetic_values(pl, rows, 1, missing).alias("Value"))
+
+    frame = pl.DataFrame({"Year": list(year_range)})
+    return frame.with_columns(
+        [synthetic_values(pl, years, i, missing).alias(names[i]) for i in range(economies)]
+    )
+
+
+def write_input(frame, path: str, source: str) -> None:
+    import polars as pl
+
+    if source == "csv":
+        frame.write_csv(path, quote_style="non_numeric")
+        with open(path, "a", encoding="utf-8") as handle:
+            handle.write("\n" + "\n".join('"{}"'.format(line) for line in FOOTER) + "\n")
+        return
+
+    first = frame.columns[0]
+    footer = pl.DataFrame({first: [None] + FOOTER}).with_columns(pl.col(first).cast(pl.Utf8))
+    text = frame.with_columns(pl.col(first).cast(pl.Utf8))
+    pl.concat([text, footer], how="diagonal").write_excel(path, autofit=False)
+
+
+def run_case(path: str, base: str, layout: str, branch: str, formats: List[str]) -> Dict:
+    lazy, parquet = BRANCHES[branch]
+    code = CHILD_CODE.format(
+        repo=REPO_DIR,
+        path=path,
+        base=base,
+        layout=layout,
+        formats=formats,
+        lazy=lazy,
+        parquet=parquet,
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def case_key(case: Dict) -> str:
+    return "{}/{}/{}".format(case["layout"], case["source"], case["branch"])
+
+
+def compare(results: List[Dict], previous_path: str) -> None:
+    with open(previous_path, "r", encoding="utf-8") as handle:
+        previous = {case_key(case): case for case in json.load(handle)["cases"]}
+
+    print("\nChange versus {}:".format(previous_path))
+    for case in results:
+        old = previous.get(case_key(case))
+        if not old or "error" in case or "error" in old:
+            continue
+        print(
+            "{:<32} time {:+6.1f}% | peak RSS {:+6.1f}%".format(
+                case_key(case),
+                100.0 * (case["seconds"] / max(old["seconds"], 1e-9) - 1),
+                100.0 * (case["peak_rss_mb"] / max(old["peak_rss_mb"], 1e-9) - 1),
+            )
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark dtabnk on synthetic DataBank inputs across layouts, sources and memory paths."
+    )
+    parser.add_argument("--economies", type=int, default=40)
+    parser.add_argument("--series", type=int, default=60)
+    parser.add_argument("--years", type=int, default=30)
+    parser.add_argument("--missing", type=float, default=0.15, help="Share of '..' cells.")
+    parser.add_argument("--layouts", nargs="*", choices=LAYOUTS, default=LAYOUTS)
+    parser.add_argument("--sources", nargs="*", choices=SOURCES, default=SOURCES)
+    parser.add_argument("--branches", nargs="*", choices=list(BRANCHES), default=list(BRANCHES))
+    parser.add_argument(
+        "--formats",
+        nargs="*",
+        choices=["dta", "sav", "rdata", "parquet"],
+        default=["dta", "parquet"],
+    )
+    parser.add_argument(
+        "--results",
+        default=RESULTS_DIR,
+        help="Directory for result JSON files (default: benchmarks/results).",
+    )
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare against.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_DIR)
+    import polars as pl
+
+    cases: List[Dict] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in args.layouts:
+            frame = make_frame(layout, args.economies, args.series, args.years, args.missing)
+            for source in args.sources:
+                path = os.path.join(tmp, "{}.{}".format(layout, source))
+                try:
+                    write_input(frame, path, source)
+                except Exception as exc:
+                    print("{:<20} {:<5} input failed: {}".format(layout, source, exc))
+                    continue
+                input_bytes = os.path.getsize(path)
+
+                for branch in args.branches:
+                    case: Dict[str, object] = {
+                        "layout": layout,
+                        "source": source,
+                        "branch": branch,
+                        "input_rows": frame.height,
+                        "input_columns": frame.width,
+                        "input_bytes": input_bytes,
+                    }
+                    base = os.path.join(tmp, "out-{}-{}-{}".format(layout, source, branch))
+                    try:
+                        stats = run_case(path, base, layout, branch, args.formats)
+                    except subprocess.CalledProcessError as exc:
+                        case["error"] = exc.stderr.strip()[-300:]
+                        print("{:<32} failed: {}".format(case_key(case), case["error"]))
+                        cases.append(case)
+                        continue
+
+                    case.update(stats)
+                    case["seconds"] = stats["process_s"] + stats["write_s"]
+                    cases.append(case)
+                    print(
+                        "{:<32} {:.2f}s ({:.2f}s read+reshape) | {:,.0f} input rows/s | peak RSS {:.0f} MB | out {:.1f} MB | {}".format(
+                            case_key(case),
+                            case["seconds"],
+                            stats["process_s"],
+                            frame.height / max(case["seconds"], 1e-9),
+                            stats["peak_rss_mb"],
+                            sum(stats["output_bytes"].values()) / 1024 / 1024,
+                            stats["policy_branch"],
+                        )
+                    )
+
+    os.makedirs(args.results, exist_ok=True)
+    results_path = os.path.join(
+        args.results, "bench-{}.json".format(time.strftime("%Y%m%d-%H%M%S"))
+    )
+    with open(results_path, "w", encoding="utf-8") as handle:
+        json.dump(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "scale": {
+                    "economies": args.economies,
+                    "series": args.series,
+                    "years": args.years,
+                    "missing": args.missing,
+                },
+                "formats": args.formats,
+                "python": platform.python_version(),
+                "polars": pl.__version__,
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "cases": cases,
+            },
+            handle,
+            indent=2,
+        )
+    print("\nResults written to {}".format(results_path))
+
+    if args.compare:
+        compare(cases, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,202 @@
 from __future__ import annotations
 
 import argparse
+import base64
+import collections
+import contextlib
 import csv
 import gc
+import glob
+import gzip
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import lzma
 import math
+import multiprocessing
 import os
 import re
+import shutil
+import signal
+import socket
+import struct
 import subprocess
 import sys
-from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
-
-REQ = ["polars", "pyreadstat", "rpy2", "openpyxl", "fastexcel", "psutil"]
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+REQ = ["polars", "numpy", "pyreadstat", "openpyxl", "fastexcel", "psutil"]
+CORE_REQ = ["polars", "psutil"]
+FORMAT_REQ = {
+    "dta": ["numpy"],
+    "sav": ["numpy", "pyreadstat"],
+    "rdata": ["numpy"],
+    "parquet": [],
+}
+EXCEL_REQ = ["fastexcel", "openpyxl"]
+EXCEL_EXTENSIONS = {".xlsx", ".xls"}
+EXCEL_STREAM_EXTENSIONS = {".xlsx"}
+EXCEL_CHUNK_ROWS = 50_000
+ZSTD_REQ = ["zstandard"]
+COMPRESSED_EXTENSIONS = {".zip", ".gz", ".zst", ".xz"}
+COMPRESSED_CHUNK_BYTES = 16 * 1024 * 1024
+INPUT_EXTENSIONS = {".csv"} | EXCEL_EXTENSIONS | COMPRESSED_EXTENSIONS
+BATCH_MANIFEST_FILE = "dtabnk-batch.json"
+SERVE_PRELOAD = ["numpy", "pyreadstat", "fastexcel", "openpyxl"]
+SERVE_TASKS_PER_WORKER = 100
 
 DEFAULT_MIN_FREE_RAM_MB = 512
 DEFAULT_PREVIEW_ROWS = 10
 DEFAULT_STREAMING_CHUNK_SIZE = 10_000
+DEFAULT_JOBS = 1
+WORKER_BASE_RAM_MB = 256
+DEFAULT_EXPORT_BATCH_BYTES = 16 * 1024 * 1024
+MAX_PIVOT_PARTITIONS = 256
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "dtabnk",
+)
+DEFAULT_CACHE_SIZE_MB = 4096
+DEFAULT_SOCKET_PATH = os.path.join(DEFAULT_CACHE_DIR, "dtabnk.sock")
+DEFAULT_INTERMEDIATE_SIZE_MB = 8192
+CACHE_HASH_CHUNK = 8 * 1024 * 1024
+UPDATE_LAYOUTS = {"wide", "wide_header_series"}
+PROFILE_SAMPLE_SECONDS = 0.01
+PROFILE_STATE: Dict[str, object] = {"records": None, "file": None, "start": 0.0}
+PROFILE_LOCAL = threading.local()
+REPORT_STATE: Dict[str, Optional[Callable[[str], None]]] = {"callback": None}
+LOGGER = logging.getLogger("dtabnk")
+FRAMING_HEAD_BYTES = 1024 * 1024
+FRAMING_TAIL_BYTES = 64 * 1024
+FOOTER_LINE_PATTERN = re.compile(rb'^"?(?:data from database:|last updated:)', re.IGNORECASE)
+MEMORY_MODEL_FILE = "memory-model.json"
+MEMORY_MODEL_MIN_OBSERVATIONS = 3
+MEMORY_MODEL_MAX_OBSERVATIONS = 64
+MEMORY_MODEL_MARGIN = 1.25
+MEMORY_MODEL_SAFE_MARGIN = 1.5
+MEMORY_MODEL_MIN_BYTES = 1024 * 1024
+MEMORY_MODEL_FLOOR = 0.1
+MEMORY_MODEL: Dict[str, object] = {
+    "path": None,
+    "layout": None,
+    "observations": {},
+    "pending": {},
+}
+
+SAV_BIAS = 100.0
+SAV_SYSMIS = -sys.float_info.max
+SAV_MAX_STR = 255
+SAV_ZBLOCK_SIZE = 0x3FF000
+SAV_COMPRESSION_BYTECODE = 1
+SAV_COMPRESSION_ZLIB = 2
+
+RDATA_COMPRESSION = ["gzip", "xz"]
+LAYOUTS = ["auto", "wide", "wide_header_series", "long", "year_rows"]
+RDATA_NA_INT = -2147483648
+RDATA_NA_REAL_BITS = 0x7FF00000000007A2
+RDATA_WRITER_VERSION = 0x040300
+RDATA_MIN_READER_VERSION = 0x020300
+RDATA_CHUNK_ROWS = 1_000_000
+RDATA_SXP = {
+    "sym": 1,
+    "list": 2,
+    "char": 9,
+    "lgl": 10,
+    "int": 13,
+    "real": 14,
+    "str": 16,
+    "vec": 19,
+    "nil": 254,
+}
+
+STATA_RELEASES = {11: 114, 12: 115, 13: 117, 14: 118, 15: 118}
+STATA_MAX_STR = {114: 244, 115: 244, 117: 2045, 118: 2045}
+STATA_MAX_NAME = 32
+STATA_NUMERIC_TYPES = {
+    "byte": {
+        "np": "<i1",
+        "pl": "Int8",
+        "min": -127,
+        "max": 100,
+        "missing": 101,
+        "old": 251,
+        "new": 65530,
+        "format": "%8.0g",
+    },
+    "int": {
+        "np": "<i2",
+        "pl": "Int16",
+        "min": -32767,
+        "max": 32740,
+        "missing": 32741,
+        "old": 252,
+        "new": 65529,
+        "format": "%8.0g",
+    },
+    "long": {
+        "np": "<i4",
+        "pl": "Int32",
+        "min": -2147483647,
+        "max": 2147483620,
+        "missing": 2147483621,
+        "old": 253,
+        "new": 65528,
+        "format": "%12.0g",
+    },
+    "float": {
+        "np": "<f4",
+        "pl": "Float32",
+        "min": None,
+        "max": None,
+        "missing": 2.0**127,
+        "old": 254,
+        "new": 65527,
+        "format": "%9.0g",
+    },
+    "double": {
+        "np": "<f8",
+        "pl": "Float64",
+        "min": None,
+        "max": None,
+        "missing": 2.0**1023,
+        "old": 255,
+        "new": 65526,
+        "format": "%10.0g",
+    },
+}
+STATA_MAP_TAGS = [
+    "stata_data",
+    "map",
+    "variable_types",
+    "varnames",
+    "sortlist",
+    "formats",
+    "value_label_names",
+    "variable_labels",
+    "characteristics",
+    "data",
+    "strls",
+    "value_labels",
+    "stata_data_close",
+    "end_of_file",
+]
+STATA_MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
 
 YEAR_ALIASES = ["Year", "year", "Time", "time", "Date", "date", "Period", "period"]
 VALUE_ALIASES = [
@@ -59,39 +241,82 @@ programme. If not, see <https://www.gnu.org/licenses/>.
 """
 
 
-def ensure_dependencies() -> None:
+def report(message: str) -> None:
+    callback = REPORT_STATE["callback"]
+    if callback is None:
+        print(message)
+    else:
+        callback(message)
+
+
+def log_message(message: str) -> None:
+    if message.startswith(("Error", "Memory safety stop")):
+        LOGGER.error(message)
+    elif message.startswith("Skipping"):
+        LOGGER.warning(message)
+    else:
+        LOGGER.info(message)
+
+
+@contextlib.contextmanager
+def reporting(callback: Optional[Callable[[str], None]]) -> Iterator[None]:
+    previous = REPORT_STATE["callback"]
+    REPORT_STATE["callback"] = callback or log_message
+    try:
+        yield
+    finally:
+        REPORT_STATE["callback"] = previous
+
+
+def ensure_dependencies(packages: Iterable[str] = REQ) -> None:
     missing: List[str] = []
-    for package in REQ:
+    for package in packages:
+        if package in missing:
+            continue
         try:
-            __import__(package)
-        except ImportError:
+            found = importlib.util.find_spec(package) is not None
+        except (ImportError, ValueError):
+            found = False
+        if not found:
             missing.append(package)
 
     if not missing:
         return
 
-    print("Installing missing packages: {}...".format(", ".join(missing)))
+    report("Installing missing packages: {}...".format(", ".join(missing)))
     try:
         subprocess.check_call([sys.executable, "-m", "pip", "install"] + missing)
     except subprocess.CalledProcessError as exc:
         sys.exit("Failed to install dependencies: {}".format(exc))
+    importlib.invalidate_caches()
+
 
+def required_packages(formats: Iterable[str], paths: Iterable[str]) -> List[str]:
+    packages: List[str] = []
+    for fmt in formats:
+        packages.extend(FORMAT_REQ.get(fmt, []))
+    if any(os.path.splitext(path)[1].lower() in EXCEL_EXTENSIONS for path in paths):
+        packages.extend(EXCEL_REQ)
+    if any(os.path.splitext(path)[1].lower() == ".zst" for path in paths):
+        packages.extend(ZSTD_REQ)
+    return [p for i, p in enumerate(packages) if p not in packages[:i]]
 
-ensure_dependencies()
+
+if __name__ == "__main__":
+    ensure_dependencies(CORE_REQ)
 
 import polars as pl
 import psutil
-import pyreadstat
-import rpy2.robjects as ro
-from rpy2.robjects import pandas2ri
-from rpy2.robjects.conversion import localconverter
-
-try:
-    pl.Config.set_streaming_chunk_size(DEFAULT_STREAMING_CHUNK_SIZE)
-except Exception:
-    pass
 
 FrameLike = Union[pl.DataFrame, pl.LazyFrame]
+ConversionJob = Tuple[str, str, List[str], argparse.Namespace]
+
+
+def configure_polars() -> None:
+    try:
+        pl.Config.set_streaming_chunk_size(DEFAULT_STREAMING_CHUNK_SIZE)
+    except Exception:
+        pass
 
 
 def get_available_ram_mb() -> int:
@@ -99,6 +324,82 @@ def get_available_ram_mb() -> int:
     return max(1, int(mem.available // (1024 * 1024)))
 
 
+def start_profile() -> None:
+    PROFILE_STATE["records"] = []
+    PROFILE_STATE["start"] = time.perf_counter()
+
+
+@contextlib.contextmanager
+def track_peak_rss() -> Iterator[Dict[str, int]]:
+    process = psutil.Process()
+    usage = {"start": process.memory_info().rss}
+    usage["peak"] = usage["start"]
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(PROFILE_SAMPLE_SECONDS):
+            usage["peak"] = max(usage["peak"], process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield usage
+    finally:
+        done.set()
+        sampler.join()
+        usage["peak"] = max(usage["peak"], process.memory_info().rss)
+        usage["delta"] = max(0, usage["peak"] - usage["start"])
+
+
+@contextlib.contextmanager
+def profile_stage(stage: str, **details) -> Iterator[Dict[str, object]]:
+    record: Dict[str, object] = {"stage": stage, "file": PROFILE_STATE["file"]}
+    record.update(details)
+    records = PROFILE_STATE["records"]
+    if records is None:
+        yield record
+        return
+
+    stack = PROFILE_LOCAL.__dict__.setdefault("stack", [])
+    if stack:
+        record["parent"] = stack[-1]
+    stack.append(stage)
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        with track_peak_rss() as usage:
+            yield record
+    finally:
+        stack.pop()
+        record["start_s"] = round(wall_start - float(PROFILE_STATE["start"]), 6)
+        record["wall_s"] = round(time.perf_counter() - wall_start, 6)
+        record["cpu_s"] = round(time.process_time() - cpu_start, 6)
+        record["rss_start_mb"] = round(usage["start"] / 1024 / 1024, 1)
+        record["peak_rss_delta_mb"] = round(usage["delta"] / 1024 / 1024, 1)
+        records.append(record)
+
+
+def profile_frame(record: Dict[str, object], frame: FrameLike) -> None:
+    record["columns"] = len(get_columns(frame))
+    if isinstance(frame, pl.DataFrame):
+        record["rows"] = frame.height
+
+
+def write_profile(path: str, args: argparse.Namespace) -> None:
+    records = sorted(
+        PROFILE_STATE["records"] or [],
+        key=lambda record: (str(record.get("file")), record["start_s"]),
+    )
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(
+            {"argv": sys.argv[1:], "jobs": args.jobs, "stages": records},
+            handle,
+            indent=2,
+        )
+    report("Info: Wrote profile to {}.".format(path))
+
+
 def derive_memory_policy(
     file_size_bytes: int,
     lazy_thresh_mb: Optional[int] = None,
@@ -106,7 +407,7 @@ def derive_memory_policy(
     safe_mode: bool = False,
     reshape_heavy: bool = False,
     multi_export: bool = False,
-) -> Dict[str, Union[int, bool]]:
+) -> Dict[str, Union[int, bool, str]]:
     avail_mb = get_available_ram_mb()
     file_mb = max(1, int(math.ceil(file_size_bytes / (1024 * 1024))))
 
@@ -166,31 +467,340 @@ def ensure_memory_headroom(
         )
 
 
-def find_header_row(path: str, delimiter: str = ",") -> int:
+def reset_job_state(args: argparse.Namespace) -> None:
+    # Warm workers run many jobs in one process, so nothing may carry over.
+    if args.profile:
+        start_profile()
+    else:
+        PROFILE_STATE["records"] = None
+    if args.no_calibrate:
+        MEMORY_MODEL["path"] = None
+        MEMORY_MODEL["pending"] = {}
+
+
+def load_memory_model(path: str) -> None:
+    MEMORY_MODEL["path"] = path
+    MEMORY_MODEL["pending"] = {}
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore", newline="") as handle:
-            reader = csv.reader(handle, delimiter=delimiter)
-            for i, row in enumerate(reader):
-                cleaned = [cell.strip() for cell in row]
-                if not cleaned or not any(cleaned):
-                    continue
-                if len(cleaned) < 2:
-                    continue
+        with open(path, "r", encoding="utf-8") as handle:
+            MEMORY_MODEL["observations"] = json.load(handle)
+    except (OSError, ValueError):
+        MEMORY_MODEL["observations"] = {}
 
-                first = cleaned[0].replace(".", "").replace("-", "")
-                has_text = any(any(ch.isalnum() for ch in cell) for cell in cleaned)
-                if not first.isdigit() and has_text:
-                    return i
-    except Exception:
+
+def save_memory_model() -> None:
+    path = MEMORY_MODEL["path"]
+    pending = MEMORY_MODEL["pending"]
+    if not path or not pending:
+        return
+
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            observations = json.load(handle)
+    except (OSError, ValueError):
+        observations = {}
+    for stage, new in pending.items():
+        merged = observations.get(stage, []) + new
+        observations[stage] = merged[-MEMORY_MODEL_MAX_OBSERVATIONS:]
+
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(observations, handle)
+        os.replace(temp_path, path)
+    except OSError as exc:
+        report("Info: Could not save memory model: {}".format(exc))
+        remove_temp_file(temp_path)
+        return
+    MEMORY_MODEL["observations"] = observations
+    MEMORY_MODEL["pending"] = {}
+
+
+def predict_multiplier(
+    stage: str, input_size_bytes: int, default: float, safe_mode: bool = False
+) -> float:
+    if not MEMORY_MODEL["path"]:
+        return default
+
+    history = MEMORY_MODEL["observations"].get(stage, []) + MEMORY_MODEL[
+        "pending"
+    ].get(stage, [])
+    history = [
+        o
+        for o in history
+        if input_size_bytes / 4 <= o["bytes"] <= input_size_bytes * 4
+    ]
+    same_layout = [o for o in history if o.get("layout") == MEMORY_MODEL["layout"]]
+    if len(same_layout) >= MEMORY_MODEL_MIN_OBSERVATIONS:
+        history = same_layout
+    if len(history) < MEMORY_MODEL_MIN_OBSERVATIONS:
+        return default
+
+    margin = MEMORY_MODEL_SAFE_MARGIN if safe_mode else MEMORY_MODEL_MARGIN
+    return max(MEMORY_MODEL_FLOOR, max(o["ratio"] for o in history) * margin)
+
+
+def record_memory_observation(stage: str, input_size_bytes: int, peak_bytes: int) -> None:
+    if not MEMORY_MODEL["path"] or input_size_bytes < MEMORY_MODEL_MIN_BYTES:
+        return
+    MEMORY_MODEL["pending"].setdefault(stage, []).append(
+        {
+            "bytes": int(input_size_bytes),
+            "ratio": round(peak_bytes / input_size_bytes, 4),
+            "layout": MEMORY_MODEL["layout"],
+        }
+    )
+
+
+@contextlib.contextmanager
+def memory_stage(
+    stage: str,
+    input_size_bytes: int,
+    multiplier: float,
+    minimum_free_mb: int = DEFAULT_MIN_FREE_RAM_MB,
+    safe_mode: bool = False,
+) -> Iterator[None]:
+    ensure_memory_headroom(
+        stage=stage,
+        input_size_bytes=input_size_bytes,
+        multiplier=predict_multiplier(stage, input_size_bytes, multiplier, safe_mode),
+        minimum_free_mb=minimum_free_mb,
+        safe_mode=safe_mode,
+    )
+    if not MEMORY_MODEL["path"]:
+        yield
+        return
+
+    with track_peak_rss() as usage:
+        yield
+    record_memory_observation(stage, input_size_bytes, usage["delta"])
+
+
+def is_header_line(line: bytes, delimiter: str) -> bool:
+    text = line.rstrip(b"\r\n").decode("utf-8", errors="ignore")
+    cleaned = [cell.strip() for cell in next(csv.reader([text], delimiter=delimiter), [])]
+    if len(cleaned) < 2 or not any(cleaned):
+        return False
+
+    first = cleaned[0].replace(".", "").replace("-", "")
+    has_text = any(any(ch.isalnum() for ch in cell) for cell in cleaned)
+    return not first.isdigit() and has_text
+
+
+def find_data_start(
+    handle: io.BufferedReader, delimiter: str, header_row: Optional[int]
+) -> Tuple[int, Optional[int]]:
+    first_data_start = None
+    for row, line in enumerate(iter(handle.readline, b"")):
+        if row == 0:
+            first_data_start = handle.tell()
+        if header_row is not None:
+            if row == header_row:
+                return row, handle.tell()
+        elif is_header_line(line, delimiter):
+            return row, handle.tell()
+        elif handle.tell() >= FRAMING_HEAD_BYTES:
+            break
+
+    if header_row is not None:
+        return header_row, None
+    return 0, first_data_start
+
+
+def find_footer_start(handle: io.BufferedReader, file_size: int) -> Optional[int]:
+    tail_start = max(0, file_size - FRAMING_TAIL_BYTES)
+    handle.seek(tail_start)
+    lines = handle.read().split(b"\n")
+    starts = [0]
+    for line in lines[:-1]:
+        starts.append(starts[-1] + len(line) + 1)
+
+    found = False
+    for i in range(len(lines) - 1, 0 if tail_start else -1, -1):
+        text = lines[i].strip()
+        if not text:
+            continue
+        if not FOOTER_LINE_PATTERN.match(text):
+            return tail_start + starts[i + 1] if found else file_size
+        found = True
+    return None if tail_start else 0
+
+
+def count_records(handle: io.BufferedReader, start: int, end: int) -> int:
+    handle.seek(start)
+    remaining = end - start
+    count = 0
+    quoted = False
+    while remaining > 0:
+        chunk = handle.read(min(CACHE_HASH_CHUNK, remaining))
+        if not chunk:
+            break
+        if quoted or b'"' in chunk:
+            for i, piece in enumerate(chunk.split(b'"')):
+                if i:
+                    quoted = not quoted
+                if not quoted:
+                    count += piece.count(b"\n")
+        else:
+            count += chunk.count(b"\n")
+        remaining -= len(chunk)
+    return count
+
+
+def get_csv_framing(
+    path: str, delimiter: str, header_row_override: Optional[int]
+) -> Tuple[int, Optional[int], Optional[int], bool]:
+    header_row = None if header_row_override is None else max(0, header_row_override)
+    file_size = os.path.getsize(path)
+    try:
+        with open(path, "rb") as handle:
+            skip_rows, data_start = find_data_start(handle, delimiter, header_row)
+            footer_start = find_footer_start(handle, file_size)
+            if footer_start is None:
+                return skip_rows, None, None, True
+            if data_start is None or footer_start == file_size:
+                return skip_rows, None, None, False
+            data_end = max(data_start, footer_start)
+            n_rows = count_records(handle, data_start, data_end)
+            return skip_rows, data_end, n_rows, False
+    except OSError:
+        return header_row or 0, None, None, True
+
+
+def csv_source(path: str, data_end: Optional[int]) -> Union[str, bytes]:
+    if data_end is None:
+        return path
+    with open(path, "rb") as handle:
+        return handle.read(data_end)
+
+
+def zip_data_member(archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+    members = [
+        info
+        for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(".csv")
+        and "metadata" not in os.path.basename(info.filename).lower()
+    ]
+    if not members:
+        raise ValueError("No data CSV found in {}.".format(archive.filename))
+    return max(members, key=lambda info: info.file_size)
+
+
+def output_base(path: str) -> str:
+    base, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSED_EXTENSIONS:
+        inner, inner_ext = os.path.splitext(base)
+        if inner_ext.lower() == ".csv":
+            base = inner
+    return base
+
+
+def source_size(path: str) -> int:
+    ext = os.path.splitext(path)[1].lower()
+    size = os.path.getsize(path)
+    try:
+        if ext == ".zip":
+            with zipfile.ZipFile(path) as archive:
+                return zip_data_member(archive).file_size
+        if ext == ".gz" and size >= 18:
+            with open(path, "rb") as handle:
+                handle.seek(-4, os.SEEK_END)
+                return max(size, struct.unpack("<I", handle.read(4))[0])
+    except (OSError, ValueError, zipfile.BadZipFile):
         pass
+    return size
 
-    return 0
 
+@contextlib.contextmanager
+def open_compressed(path: str) -> Iterator[io.BufferedIOBase]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".zip":
+        with zipfile.ZipFile(path) as archive:
+            member = zip_data_member(archive)
+            report("Info: Reading {} from {}.".format(member.filename, path))
+            with archive.open(member) as handle:
+                yield handle
+    elif ext == ".gz":
+        with gzip.open(path, "rb") as handle:
+            yield handle
+    elif ext == ".xz":
+        with lzma.open(path, "rb") as handle:
+            yield handle
+    elif ext == ".zst":
+        import zstandard
+
+        with open(path, "rb") as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw)
+            with io.BufferedReader(reader) as handle:
+                yield handle
+    else:
+        raise ValueError("Unsupported compressed format: {}".format(ext))
+
+
+def record_cut(data: bytes, limit: int) -> int:
+    # data starts on a record boundary, so an odd quote count means the newline is inside a field.
+    cut = data.rfind(b"\n", 0, limit) + 1
+    quoted = data.count(b'"', 0, cut) % 2
+    while quoted and cut > 0:
+        prev = data.rfind(b"\n", 0, cut - 1) + 1
+        quoted ^= data.count(b'"', prev, cut) % 2
+        cut = prev
+    return cut
+
+
+def stream_csv_to_parquet(
+    handle: io.BufferedIOBase,
+    target_dir: str,
+    delimiter: str,
+    header_row_override: Optional[int],
+    chunk_bytes: int = COMPRESSED_CHUNK_BYTES,
+) -> Tuple[int, int]:
+    head = handle.read(FRAMING_HEAD_BYTES)
+    head += handle.readline()
+    header_row = None if header_row_override is None else max(0, header_row_override)
+    skip_rows, data_start = find_data_start(io.BytesIO(head), delimiter, header_row)
+    if data_start is None:
+        raise ValueError("Header row {} is beyond the end of the input.".format(skip_rows))
+    header_line = head[head.rfind(b"\n", 0, data_start - 1) + 1 : data_start]
+    if not header_line.endswith(b"\n"):
+        header_line += b"\n"
+    os.makedirs(target_dir, exist_ok=True)
+
+    parts = 0
+    rows = 0
+
+    def write_part(data: bytes, final: bool = False) -> None:
+        nonlocal parts, rows
+        frame = pl.read_csv(
+            header_line + data,
+            separator=delimiter,
+            infer_schema_length=0,
+        )
+        if final:
+            frame = collect_frame(strip_bottom_metadata(frame))
+        frame.write_parquet(
+            os.path.join(target_dir, "part-{:05d}.parquet".format(parts)),
+            compression="zstd",
+        )
+        parts += 1
+        rows += frame.height
+
+    pending = head[data_start:]
+    for chunk in iter(lambda: handle.read(chunk_bytes), b""):
+        pending += chunk
+        cut = record_cut(pending, max(0, len(pending) - FRAMING_TAIL_BYTES))
+        if cut > 0:
+            write_part(pending[:cut])
+            pending = pending[cut:]
 
-def get_skip_rows(path: str, delimiter: str, header_row_override: Optional[int]) -> int:
-    if header_row_override is not None:
-        return max(0, header_row_override)
-    return find_header_row(path, delimiter=delimiter)
+    footer_start = find_footer_start(io.BytesIO(pending), len(pending))
+    if footer_start is None:
+        write_part(pending, final=True)
+    elif footer_start or not parts:
+        write_part(pending[:footer_start])
+    return skip_rows, rows
 
 
 def collect_with_engine(lf: pl.LazyFrame) -> pl.DataFrame:
@@ -208,16 +818,92 @@ def collect_frame(frame: FrameLike) -> pl.DataFrame:
     return frame
 
 
+def iter_frame_batches(frame: FrameLike, batch_rows: int) -> Iterator[pl.DataFrame]:
+    batch_rows = max(1, batch_rows)
+    if isinstance(frame, pl.DataFrame):
+        yield from frame.iter_slices(batch_rows)
+        return
+
+    if hasattr(frame, "collect_batches"):
+        try:
+            batches = frame.collect_batches(chunk_size=batch_rows, maintain_order=True)
+        except TypeError:
+            batches = None
+        if batches is not None:
+            yield from batches
+            return
+
+    offset = 0
+    while True:
+        batch = collect_frame(frame.slice(offset, batch_rows))
+        if batch.height == 0:
+            return
+        yield batch
+        offset += batch.height
+
+
 def get_columns(frame: FrameLike) -> List[str]:
     if isinstance(frame, pl.LazyFrame):
         return frame.collect_schema().names()
     return list(frame.columns)
 
 
-def estimate_frame_bytes(frame: FrameLike, fallback_bytes: int) -> int:
-    if isinstance(frame, pl.DataFrame):
-        return max(frame.estimated_size(), 1)
-    return max(fallback_bytes, 1)
+def dtype_width(dtype: pl.DataType, text_bytes: float = 0.0) -> float:
+    if dtype == pl.Categorical or isinstance(dtype, pl.Enum):
+        return 4.0
+    if dtype in (pl.Int8, pl.UInt8, pl.Boolean):
+        return 1.0
+    if dtype in (pl.Int16, pl.UInt16):
+        return 2.0
+    if dtype in (pl.Int32, pl.UInt32, pl.Float32):
+        return 4.0
+    if dtype.is_numeric():
+        return 8.0
+    return text_bytes
+
+
+def estimate_pivot_bytes(
+    frame: FrameLike, index: List[str], columns: str, values: str = "Value"
+) -> int:
+    schema = frame.collect_schema() if isinstance(frame, pl.LazyFrame) else frame.schema
+    with profile_stage("pivot sizing") as stage:
+        stats = collect_frame(
+            frame.lazy().select(
+                [pl.len().alias("__rows__")]
+                + [
+                    pl.col(name).approx_n_unique().alias("__distinct_{}__".format(i))
+                    for i, name in enumerate(index + [columns])
+                ]
+                + [
+                    pl.col(name)
+                    .cast(pl.Utf8)
+                    .str.len_bytes()
+                    .mean()
+                    .alias("__bytes_{}__".format(i))
+                    for i, name in enumerate([index[0], columns])
+                ]
+            )
+        ).row(0)
+
+        rows = int(stats[0])
+        distinct = [int(n) for n in stats[1 : len(index) + 2]]
+        id_bytes, series_bytes = (float(b or 0) for b in stats[len(index) + 2 :])
+
+        id_width = dtype_width(schema[index[0]], id_bytes)
+        series_width = dtype_width(schema[columns], series_bytes)
+        index_width = id_width + sum(dtype_width(schema[name], 8.0) for name in index[1:])
+        value_width = dtype_width(schema[values], 8.0) + 1
+
+        wide_rows = min(rows, math.prod(distinct[:-1]))
+        est_bytes = wide_rows * (index_width + value_width * distinct[-1])
+        if isinstance(frame, pl.LazyFrame):
+            est_bytes += rows * (index_width + series_width + value_width)
+        stage.update(
+            rows=rows,
+            distinct_keys=distinct,
+            estimated_mb=round(est_bytes / (1024 * 1024), 2),
+        )
+    return max(int(est_bytes), 1)
 
 
 def strip_bottom_metadata(frame: FrameLike) -> FrameLike:
@@ -281,6 +967,35 @@ def parse_header_series_column(name: str) -> Optional[Tuple[int, str, Optional[s
     return year, series, series_code
 
 
+def join_preserving_order(frame: FrameLike, other: FrameLike, on: str) -> FrameLike:
+    try:
+        return frame.join(other, on=on, how="left", maintain_order="left")
+    except TypeError:
+        return frame.join(other, on=on, how="left")
+
+
+def header_series_lookup(
+    header_cols: List[str],
+    raw_columns_by_name: Optional[Dict[str, str]],
+    header_dtype: pl.DataType,
+) -> pl.DataFrame:
+    years: List[int] = []
+    keys: List[str] = []
+    for col in header_cols:
+        raw_name = raw_columns_by_name.get(col, col) if raw_columns_by_name else col
+        year, series, series_code = parse_header_series_column(raw_name)
+        years.append(year)
+        keys.append("{} [{}]".format(series, series_code) if series_code else series)
+
+    return pl.DataFrame(
+        {
+            "__Header__": pl.Series(header_cols, dtype=header_dtype),
+            "Year": pl.Series(years, dtype=pl.Int16),
+            "Series_Key": pl.Series(keys, dtype=pl.Categorical),
+        }
+    )
+
+
 def detect_header_series_wide_layout(
     frame: FrameLike,
     raw_columns_by_name: Optional[Dict[str, str]] = None,
@@ -312,23 +1027,237 @@ def detect_header_series_wide_layout(
     return matches >= 2 and matches >= max(2, int(candidates * 0.5))
 
 
-def read_excel_compat(path: str) -> pl.DataFrame:
+def read_excel_compat(path: str, sheet: Optional[str] = None) -> pl.DataFrame:
     errors: List[str] = []
 
     for engine in ("calamine", "openpyxl"):
         try:
-            return pl.read_excel(path, engine=engine)
+            return pl.read_excel(path, sheet_name=sheet, engine=engine)
         except Exception as exc:
             errors.append("{}: {}".format(engine, exc))
 
     try:
-        return pl.read_excel(path)
+        return pl.read_excel(path, sheet_name=sheet)
     except Exception as exc:
         errors.append("default: {}".format(exc))
 
     raise RuntimeError("Failed to read Excel file. " + " | ".join(errors[-3:]))
 
 
+def excel_sheet_names(path: str) -> List[str]:
+    try:
+        import fastexcel
+
+        return list(fastexcel.read_excel(path).sheet_names)
+    except Exception:
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+
+
+def resolve_sheets(path: str, requested: List[str]) -> List[str]:
+    names = excel_sheet_names(path)
+    sheets: List[str] = []
+    for item in requested:
+        if item.lower() == "all":
+            chosen = names
+        elif item in names:
+            chosen = [item]
+        elif item.isdigit() and 1 <= int(item) <= len(names):
+            chosen = [names[int(item) - 1]]
+        else:
+            raise ValueError(
+                "Sheet '{}' not found in {} (sheets: {}).".format(
+                    item, path, ", ".join(names)
+                )
+            )
+        sheets.extend(name for name in chosen if name not in sheets)
+    return sheets
+
+
+def excel_column_names(header: Tuple[object, ...]) -> List[str]:
+    names: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, cell in enumerate(header):
+        name = "__UNNAMED__{}".format(i) if cell is None else str(cell)
+        if name in seen:
+            seen[name] += 1
+            name = "{}_duplicated_{}".format(name, seen[name] - 1)
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+
+def stream_excel_to_parquet(
+    path: str,
+    target_dir: str,
+    sheet: Optional[str] = None,
+    chunk_rows: int = EXCEL_CHUNK_ROWS,
+) -> int:
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        worksheet.reset_dimensions()
+        rows = (
+            row
+            for row in worksheet.iter_rows(values_only=True)
+            if any(cell is not None for cell in row)
+        )
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Excel sheet is empty: {}".format(path))
+
+        columns = excel_column_names(header)
+        width = len(columns)
+        schema = {name: pl.Utf8 for name in columns}
+        os.makedirs(target_dir, exist_ok=True)
+
+        parts = 0
+        total_rows = 0
+        for chunk in iter(lambda: list(itertools.islice(rows, chunk_rows)), []):
+            frame = pl.DataFrame(
+                [
+                    [None if cell is None else str(cell) for cell in row[:width]]
+                    + [None] * (width - len(row))
+                    for row in chunk
+                ],
+                schema=schema,
+                orient="row",
+            )
+            frame.write_parquet(
+                os.path.join(target_dir, "part-{:05d}.parquet".format(parts)),
+                compression="zstd",
+            )
+            parts += 1
+            total_rows += frame.height
+            del frame, chunk
+
+        if not parts:
+            pl.DataFrame(schema=schema).write_parquet(
+                os.path.join(target_dir, "part-00000.parquet")
+            )
+        return total_rows
+    finally:
+        workbook.close()
+
+
+def intermediate_key(
+    path: str,
+    skip_rows: Optional[int],
+    n_rows: Optional[int],
+    delimiter: str,
+    sheet: Optional[str] = None,
+) -> str:
+    stat = os.stat(path)
+    identity = {
+        "version": CACHE_VERSION,
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "skip_rows": skip_rows,
+        "n_rows": n_rows,
+        "delimiter": delimiter,
+        "sheet": sheet,
+    }
+    encoded = json.dumps(identity, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def intermediate_temp_path(path: str, stored_path: Optional[str]) -> str:
+    if stored_path:
+        return "{}.{}.tmp".format(stored_path, os.getpid())
+    return "{}.parquet.tmp".format(path)
+
+
+def publish_intermediate(temp_path: str, stored_path: str, store_size_mb: int) -> None:
+    try:
+        os.replace(temp_path, stored_path)
+    except OSError:
+        if not os.path.isdir(stored_path):
+            raise
+        remove_temp_file(temp_path)
+    evict_cache(os.path.dirname(stored_path), store_size_mb)
+
+
+def read_compressed_source(
+    path: str,
+    policy: Dict[str, Union[int, bool, str]],
+    delimiter: str,
+    header_row_override: Optional[int],
+    store_dir: Optional[str],
+    store_size_mb: int,
+    file_size: int,
+    safe_mode: bool,
+) -> Tuple[FrameLike, Optional[str], Dict[str, Union[int, bool, str]]]:
+    if not (policy["use_lazy"] or policy["use_parquet"]):
+        header_row = None if header_row_override is None else max(0, header_row_override)
+        with memory_stage(
+            stage="eager compressed read",
+            input_size_bytes=file_size,
+            multiplier=2.5,
+            minimum_free_mb=DEFAULT_MIN_FREE_RAM_MB,
+            safe_mode=safe_mode,
+        ):
+            with open_compressed(path) as handle:
+                data = handle.read()
+            skip_rows, data_start = find_data_start(io.BytesIO(data), delimiter, header_row)
+            if data_start is None:
+                raise ValueError(
+                    "Header row {} is beyond the end of the input.".format(skip_rows)
+                )
+            footer_start = find_footer_start(io.BytesIO(data), len(data))
+            if footer_start is not None:
+                data = data[: max(data_start, footer_start)]
+            frame = pl.read_csv(data, skip_rows=skip_rows, separator=delimiter)
+            del data
+        policy["branch"] = "eager compressed CSV"
+        if footer_start is None:
+            frame = collect_frame(strip_bottom_metadata(frame))
+        return frame, None, policy
+
+    stored_path = None
+    if store_dir:
+        stored_path = os.path.join(
+            store_dir,
+            "{}.parquet".format(
+                intermediate_key(path, header_row_override, None, delimiter)
+            ),
+        )
+        try:
+            os.utime(stored_path)
+            report("Reusing stored Parquet intermediate: {}".format(stored_path))
+            policy["branch"] = "stored Parquet intermediate"
+            return pl.scan_parquet(stored_path), None, policy
+        except OSError:
+            os.makedirs(store_dir, exist_ok=True)
+
+    report("Compressed input. Decompressing straight into a Parquet intermediate...")
+    temp_parquet_path = intermediate_temp_path(path, stored_path)
+    try:
+        with profile_stage("intermediate sink", branch="compressed stream") as stage:
+            with open_compressed(path) as handle:
+                skip_rows, rows = stream_csv_to_parquet(
+                    handle, temp_parquet_path, delimiter, header_row_override
+                )
+            stage.update(skip_rows=skip_rows, rows=rows)
+    except Exception:
+        remove_temp_file(temp_parquet_path)
+        raise
+
+    report("Parquet intermediate conversion complete.")
+    policy["branch"] = "compressed stream Parquet intermediate"
+    if stored_path:
+        publish_intermediate(temp_parquet_path, stored_path, store_size_mb)
+        return pl.scan_parquet(stored_path), None, policy
+    return pl.scan_parquet(temp_parquet_path), temp_parquet_path, policy
+
+
 def read_source(
     path: str,
     lazy_thresh_mb: Optional[int],
@@ -338,12 +1267,27 @@ def read_source(
     header_row_override: Optional[int],
     reshape_heavy: bool = False,
     multi_export: bool = False,
-) -> Tuple[FrameLike, Optional[str], Dict[str, Union[int, bool]]]:
+    store_dir: Optional[str] = None,
+    store_size_mb: int = DEFAULT_INTERMEDIATE_SIZE_MB,
+    sheet: Optional[str] = None,
+) -> Tuple[FrameLike, Optional[str], Dict[str, Union[int, bool, str]]]:
     ext = os.path.splitext(path)[1].lower()
-    file_size = os.path.getsize(path)
-    skip_rows = (
-        get_skip_rows(path, delimiter, header_row_override) if ext == ".csv" else 0
-    )
+    file_size = source_size(path)
+    with profile_stage("CSV framing") as stage:
+        skip_rows, data_end, n_rows, footer_filter = (
+            get_csv_framing(path, delimiter, header_row_override)
+            if ext == ".csv"
+            else (0, None, None, True)
+        )
+        stage.update(
+            skip_rows=skip_rows,
+            data_end=data_end,
+            n_rows=n_rows,
+            footer_filter=footer_filter,
+        )
+
+    def strip_footer(frame: FrameLike) -> FrameLike:
+        return strip_bottom_metadata(frame) if footer_filter else frame
 
     policy = derive_memory_policy(
         file_size_bytes=file_size,
@@ -354,7 +1298,7 @@ def read_source(
         multi_export=multi_export,
     )
 
-    print(
+    report(
         "Available RAM: {} MB | File: {} MB | Lazy threshold: {} MB | Parquet threshold: {} MB".format(
             policy["avail_mb"],
             policy["file_mb"],
@@ -363,32 +1307,66 @@ def read_source(
         )
     )
 
+    if ext in COMPRESSED_EXTENSIONS:
+        return read_compressed_source(
+            path,
+            policy,
+            delimiter,
+            header_row_override,
+            store_dir,
+            store_size_mb,
+            file_size,
+            safe_mode,
+        )
+
     use_lazy = bool(policy["use_lazy"])
     use_parquet = bool(policy["use_parquet"])
     temp_parquet_path = None
+    stored_path = None
+
+    streams = ext == ".csv" or ext in EXCEL_STREAM_EXTENSIONS
+    if store_dir and (use_parquet or (streams and use_lazy)):
+        stored_path = os.path.join(
+            store_dir,
+            "{}.parquet".format(intermediate_key(path, skip_rows, n_rows, delimiter, sheet)),
+        )
+        try:
+            os.utime(stored_path)
+            report("Reusing stored Parquet intermediate: {}".format(stored_path))
+            policy["branch"] = "stored Parquet intermediate"
+            return strip_footer(pl.scan_parquet(stored_path)), None, policy
+        except OSError:
+            os.makedirs(store_dir, exist_ok=True)
 
     if ext == ".csv" and (use_parquet or use_lazy):
-        print(
+        report(
             "Large file ({:.1f} MB). Using streaming CSV -> Parquet intermediate...".format(
                 file_size / 1024 / 1024
             )
         )
 
-        temp_parquet_path = "{}.parquet.tmp".format(path)
+        temp_parquet_path = intermediate_temp_path(path, stored_path)
 
         try:
             lf = pl.scan_csv(
                 path,
                 skip_rows=skip_rows,
+                n_rows=n_rows,
                 separator=delimiter,
                 low_memory=True,
             )
-            lf.sink_parquet(temp_parquet_path, compression="zstd")
+            with profile_stage("intermediate sink", branch="streaming"):
+                lf.sink_parquet(temp_parquet_path, compression="zstd")
+            report("Parquet intermediate conversion complete.")
+            policy["branch"] = "streaming Parquet intermediate"
+            if stored_path:
+                publish_intermediate(temp_parquet_path, stored_path, store_size_mb)
+                frame = pl.scan_parquet(stored_path)
+                return strip_footer(frame), None, policy
             frame = pl.scan_parquet(temp_parquet_path)
-            print("Parquet intermediate conversion complete.")
-            return strip_bottom_metadata(frame), temp_parquet_path, policy
+            return strip_footer(frame), temp_parquet_path, policy
         except Exception as exc:
-            print(
+            report(
                 "Streaming Parquet intermediate failed: {}. Falling back.".format(exc)
             )
             if os.path.exists(temp_parquet_path):
@@ -398,42 +1376,71 @@ def read_source(
                     pass
             temp_parquet_path = None
 
+    if ext in EXCEL_STREAM_EXTENSIONS and (use_parquet or use_lazy):
+        report(
+            "Large file ({:.1f} MB). Streaming Excel rows to a Parquet intermediate...".format(
+                file_size / 1024 / 1024
+            )
+        )
+
+        temp_parquet_path = intermediate_temp_path(path, stored_path)
+
+        try:
+            with profile_stage("intermediate sink", branch="streaming Excel") as stage:
+                stage["rows"] = stream_excel_to_parquet(path, temp_parquet_path, sheet)
+            report("Parquet intermediate conversion complete.")
+            policy["branch"] = "streaming Excel Parquet intermediate"
+            if stored_path:
+                publish_intermediate(temp_parquet_path, stored_path, store_size_mb)
+                return strip_footer(pl.scan_parquet(stored_path)), None, policy
+            frame = pl.scan_parquet(temp_parquet_path)
+            return strip_footer(frame), temp_parquet_path, policy
+        except Exception as exc:
+            report("Streaming Excel read failed: {}. Falling back.".format(exc))
+            remove_temp_file(temp_parquet_path)
+            temp_parquet_path = None
+
     if use_parquet:
-        print(
+        report(
             "Large file ({:.1f} MB). Using Parquet intermediate for efficiency...".format(
                 file_size / 1024 / 1024
             )
         )
 
-        ensure_memory_headroom(
+        temp_parquet_path = intermediate_temp_path(path, stored_path)
+
+        with memory_stage(
             stage="source read before Parquet intermediate",
             input_size_bytes=file_size,
             multiplier=1.2 if ext == ".csv" else 2.0,
             minimum_free_mb=DEFAULT_MIN_FREE_RAM_MB,
             safe_mode=safe_mode,
-        )
-
-        temp_parquet_path = "{}.parquet.tmp".format(path)
-
-        if ext == ".csv":
-            df_src = pl.read_csv(
-                path,
-                skip_rows=skip_rows,
-                separator=delimiter,
-                low_memory=True,
-            )
-        elif ext in {".xlsx", ".xls"}:
-            df_src = read_excel_compat(path)
-        else:
-            raise ValueError("Unsupported format: {}".format(ext))
-
-        df_src = collect_frame(strip_bottom_metadata(df_src))
-        df_src.write_parquet(temp_parquet_path, compression="zstd")
-        del df_src
-        gc.collect()
+        ):
+            with profile_stage("intermediate sink", branch="eager") as stage:
+                if ext == ".csv":
+                    df_src = pl.read_csv(
+                        csv_source(path, data_end),
+                        skip_rows=skip_rows,
+                        separator=delimiter,
+                        low_memory=True,
+                    )
+                elif ext in EXCEL_EXTENSIONS:
+                    df_src = read_excel_compat(path, sheet)
+                else:
+                    raise ValueError("Unsupported format: {}".format(ext))
+
+                df_src = collect_frame(strip_footer(df_src))
+                profile_frame(stage, df_src)
+                df_src.write_parquet(temp_parquet_path, compression="zstd")
+                del df_src
+                gc.collect()
 
+        report("Parquet intermediate conversion complete.")
+        policy["branch"] = "eager Parquet intermediate"
+        if stored_path:
+            publish_intermediate(temp_parquet_path, stored_path, store_size_mb)
+            return pl.scan_parquet(stored_path), None, policy
         frame = pl.scan_parquet(temp_parquet_path)
-        print("Parquet intermediate conversion complete.")
         return frame, temp_parquet_path, policy
 
     if ext == ".csv":
@@ -442,51 +1449,56 @@ def read_source(
                 frame = pl.scan_csv(
                     path,
                     skip_rows=skip_rows,
+                    n_rows=n_rows,
                     separator=delimiter,
                     low_memory=True,
                 )
-                return strip_bottom_metadata(frame), None, policy
+                policy["branch"] = "lazy CSV"
+                return strip_footer(frame), None, policy
             except Exception:
-                ensure_memory_headroom(
+                with memory_stage(
                     stage="eager CSV read fallback",
                     input_size_bytes=file_size,
                     multiplier=1.5,
                     minimum_free_mb=DEFAULT_MIN_FREE_RAM_MB,
                     safe_mode=safe_mode,
-                )
-                frame = pl.read_csv(
-                    path,
-                    skip_rows=skip_rows,
-                    separator=delimiter,
-                    low_memory=True,
-                )
-                return strip_bottom_metadata(frame), None, policy
-
-        ensure_memory_headroom(
+                ):
+                    frame = pl.read_csv(
+                        csv_source(path, data_end),
+                        skip_rows=skip_rows,
+                        separator=delimiter,
+                        low_memory=True,
+                    )
+                policy["branch"] = "eager CSV fallback"
+                return strip_footer(frame), None, policy
+
+        with memory_stage(
             stage="eager CSV read",
             input_size_bytes=file_size,
             multiplier=1.5,
             minimum_free_mb=DEFAULT_MIN_FREE_RAM_MB,
             safe_mode=safe_mode,
-        )
-        frame = pl.read_csv(
-            path,
-            skip_rows=skip_rows,
-            separator=delimiter,
-            low_memory=True,
-        )
-        return strip_bottom_metadata(frame), None, policy
+        ):
+            frame = pl.read_csv(
+                csv_source(path, data_end),
+                skip_rows=skip_rows,
+                separator=delimiter,
+                low_memory=True,
+            )
+        policy["branch"] = "eager CSV"
+        return strip_footer(frame), None, policy
 
-    if ext in {".xlsx", ".xls"}:
-        ensure_memory_headroom(
+    if ext in EXCEL_EXTENSIONS:
+        with memory_stage(
             stage="Excel read",
             input_size_bytes=file_size,
             multiplier=2.5 if safe_mode else 2.0,
             minimum_free_mb=DEFAULT_MIN_FREE_RAM_MB,
             safe_mode=safe_mode,
-        )
-        frame = read_excel_compat(path)
-        return strip_bottom_metadata(frame), None, policy
+        ):
+            frame = read_excel_compat(path, sheet)
+        policy["branch"] = "eager Excel"
+        return strip_footer(frame), None, policy
 
     raise ValueError("Unsupported format: {}".format(ext))
 
@@ -530,7 +1542,7 @@ def resolve_column_name(
     hit = find_column_name(frame, candidates, exclude=exclude)
     if hit is not None:
         if requested and hit != sanitise_one(requested):
-            print("Info: Using '{}' for {} '{}'.".format(hit, label, requested))
+            report("Info: Using '{}' for {} '{}'.".format(hit, label, requested))
         return hit
 
     if not required:
@@ -581,14 +1593,14 @@ def resolve_id_column(
         if col in {"Year", "Value", "Series", "Series_Name"}:
             continue
         if not is_year_like(col):
-            print("Info: Using '{}' as ID column.".format(col))
+            report("Info: Using '{}' as ID column.".format(col))
             return col
 
     available = ", ".join(get_columns(frame)[:20])
     raise ValueError("Unable to resolve ID column. Available: {}".format(available))
 
 
-def detect_layout(
+def find_layout(
     frame: FrameLike,
     requested_layout: str,
     year_col: Optional[str],
@@ -620,23 +1632,68 @@ def detect_layout(
     return "wide"
 
 
+def detect_layout(
+    frame: FrameLike,
+    requested_layout: str,
+    year_col: Optional[str],
+    value_col: Optional[str],
+    raw_columns_by_name: Optional[Dict[str, str]] = None,
+) -> str:
+    with profile_stage("layout detection", requested=requested_layout) as stage:
+        stage["layout"] = find_layout(
+            frame, requested_layout, year_col, value_col, raw_columns_by_name
+        )
+    return str(stage["layout"])
+
+
+def cast_value_expr(value_col: str = "Value", float32: bool = False) -> pl.Expr:
+    return (
+        pl.when(pl.col(value_col).cast(pl.Utf8, strict=False) == "..")
+        .then(None)
+        .otherwise(pl.col(value_col))
+        .cast(pl.Float64, strict=False)
+        .cast(pl.Float32 if float32 else pl.Float64)
+        .alias(value_col)
+    )
+
+
 def cast_year_and_value(
-    frame: FrameLike, year_col: str, value_col: str = "Value"
+    frame: FrameLike,
+    year_col: str,
+    value_col: str = "Value",
+    key_cols: Iterable[str] = (),
+    float32: bool = False,
 ) -> FrameLike:
+    with profile_stage("cast") as stage:
+        frame = frame.with_columns(
+            [
+                pl.col(year_col)
+                .cast(pl.Utf8, strict=False)
+                .str.extract(r"(\d{4})")
+                .cast(pl.Int16, strict=False)
+                .alias(year_col),
+                cast_value_expr(value_col, float32),
+            ]
+            + [pl.col(name).cast(pl.Utf8).cast(pl.Categorical) for name in key_cols]
+        ).filter(pl.col(year_col).is_not_null())
+        profile_frame(stage, frame)
+    return frame
+
+
+def widen_key_dtypes(frame: FrameLike) -> FrameLike:
+    schema = frame.collect_schema() if isinstance(frame, pl.LazyFrame) else frame.schema
     return frame.with_columns(
         [
-            pl.col(year_col)
-            .cast(pl.Utf8, strict=False)
-            .str.extract(r"(\d{4})")
-            .cast(pl.Int32, strict=False)
-            .alias(year_col),
-            pl.when(pl.col(value_col).cast(pl.Utf8, strict=False) == "..")
-            .then(None)
-            .otherwise(pl.col(value_col))
-            .cast(pl.Float64, strict=False)
-            .alias(value_col),
+            pl.col(name).cast(pl.Utf8)
+            for name, dtype in schema.items()
+            if dtype == pl.Categorical or isinstance(dtype, pl.Enum)
+        ]
+        + [
+            pl.col(name).cast(pl.Int32)
+            for name, dtype in schema.items()
+            if name == "Year" and dtype == pl.Int16
         ]
-    ).filter(pl.col(year_col).is_not_null())
+    )
 
 
 def pivot_eager(
@@ -646,36 +1703,223 @@ def pivot_eager(
     values: str,
     aggregate_function: str = "mean",
 ) -> pl.DataFrame:
-    df = collect_frame(frame)
+    with profile_stage("pivot", mode="eager") as stage:
+        df = collect_frame(frame)
 
-    try:
-        return df.pivot(
-            on=columns,
-            index=index,
-            values=values,
-            aggregate_function=aggregate_function,
-        )
-    except TypeError:
-        return df.pivot(
-            index=index,
-            columns=columns,
-            values=values,
-            aggregate_function=aggregate_function,
-        )
+        try:
+            pivoted = df.pivot(
+                on=columns,
+                index=index,
+                values=values,
+                aggregate_function=aggregate_function,
+            )
+        except TypeError:
+            pivoted = df.pivot(
+                index=index,
+                columns=columns,
+                values=values,
+                aggregate_function=aggregate_function,
+            )
+        profile_frame(stage, pivoted)
+    return pivoted
 
 
-def should_allow_pivot(
-    frame: FrameLike,
-    fallback_bytes: int,
-    min_free_ram_mb: int,
-    safe_mode: bool,
-) -> bool:
-    est_bytes = estimate_frame_bytes(frame, fallback_bytes=fallback_bytes)
+def pivot_budget_mb(min_free_ram_mb: int, safe_mode: bool) -> int:
     avail_mb = get_available_ram_mb()
     reserve_mb = max(min_free_ram_mb, 1024 if safe_mode else min_free_ram_mb)
     budget_mb = max(0, avail_mb - reserve_mb)
-    required_mb = int(math.ceil((est_bytes * (3.5 if safe_mode else 3.0)) / (1024 * 1024)))
-    return required_mb < max(256, int(budget_mb * (0.60 if safe_mode else 0.75)))
+    return max(256, int(budget_mb * (0.60 if safe_mode else 0.75)))
+
+
+def pivot_required_mb(est_bytes: int, safe_mode: bool) -> int:
+    multiplier = predict_multiplier("pivot", est_bytes, 3.5 if safe_mode else 3.0, safe_mode)
+    return int(math.ceil((est_bytes * multiplier) / (1024 * 1024)))
+
+
+def should_allow_pivot(
+    est_bytes: int,
+    min_free_ram_mb: int,
+    safe_mode: bool,
+) -> bool:
+    required_mb = pivot_required_mb(est_bytes, safe_mode)
+    return required_mb < pivot_budget_mb(min_free_ram_mb, safe_mode)
+
+
+def partitioned_sink(base_path: str, key: str):
+    if hasattr(pl, "PartitionBy"):
+        return pl.PartitionBy(base_path, key=key, include_key=False)
+    return pl.PartitionByKey(base_path, by=key, include_key=False)
+
+
+def merge_ordered_shards(
+    paths: List[str], key: str, out_dir: str, batch_rows: int
+) -> List[str]:
+    # Each shard is sorted on key. Rounds emit every buffered row up to the
+    # smallest buffered maximum, so memory stays at one batch per shard.
+    shards = [
+        (batch for batch in iter_frame_batches(pl.scan_parquet(path), batch_rows) if batch.height)
+        for path in paths
+    ]
+    buffers = [next(shard, None) for shard in shards]
+    pending: List[pl.DataFrame] = []
+    pending_rows = 0
+    merged_paths: List[str] = []
+
+    def flush() -> None:
+        merged_path = os.path.join(out_dir, "merged-{:06d}.parquet".format(len(merged_paths)))
+        pl.concat(pending).drop(key).write_parquet(merged_path)
+        merged_paths.append(merged_path)
+        pending.clear()
+
+    while any(buffer is not None for buffer in buffers):
+        threshold = min(
+            buffer.get_column(key)[-1] for buffer in buffers if buffer is not None
+        )
+        parts = []
+        for i, buffer in enumerate(buffers):
+            if buffer is None:
+                continue
+            cut = int(buffer.get_column(key).search_sorted(threshold, side="right"))
+            if cut:
+                parts.append(buffer.head(cut))
+            buffers[i] = buffer.slice(cut) if cut < buffer.height else next(shards[i], None)
+
+        merged = pl.concat(parts).sort(key)
+        pending.append(merged)
+        pending_rows += merged.height
+        if pending_rows >= batch_rows:
+            flush()
+            pending_rows = 0
+
+    if pending:
+        flush()
+    return merged_paths
+
+
+def pivot_partitioned(
+    frame: FrameLike,
+    index: List[str],
+    columns: str,
+    values: str,
+    est_bytes: int,
+    min_free_ram_mb: int,
+    safe_mode: bool,
+    aggregate_function: str = "mean",
+    spill_dir: Optional[str] = None,
+    temp_paths: Optional[List[str]] = None,
+) -> FrameLike:
+    partitions = int(
+        math.ceil(
+            pivot_required_mb(est_bytes, safe_mode)
+            / max(1, pivot_budget_mb(min_free_ram_mb, safe_mode))
+        )
+    )
+    partitions = max(2, min(MAX_PIVOT_PARTITIONS, partitions))
+    report(
+        "Info: Pivot exceeds memory guard; pivoting out of core in {} partitions.".format(
+            partitions
+        )
+    )
+
+    lf = frame.lazy().select(index + [columns, values]).with_row_index("__order__")
+    partition_key = (pl.col(index[0]).hash(seed=0) % partitions).alias("__part__")
+    lf = lf.with_columns(partition_key)
+
+    with profile_stage("pivot", mode="partitioned", partitions=partitions):
+        try:
+            work_dir = tempfile.mkdtemp(prefix="dtabnk-pivot-", dir=spill_dir)
+        except OSError:
+            work_dir = tempfile.mkdtemp(prefix="dtabnk-pivot-")
+        keep_work_dir = False
+        try:
+            long_dir = os.path.join(work_dir, "long")
+            # One streaming pass writes every shard; the plan is not re-run per shard.
+            lf.sink_parquet(partitioned_sink(long_dir, "__part__"), mkdir=True)
+            shards = [
+                sorted(glob.glob(os.path.join(long_dir, "__part__={}".format(part), "*")))
+                for part in range(partitions)
+            ]
+            shard_files = [path for files in shards for path in files]
+            series_order = (
+                collect_frame(
+                    pl.scan_parquet(shard_files, hive_partitioning=False)
+                    .group_by(columns)
+                    .agg(pl.col("__order__").min())
+                    .sort("__order__")
+                )
+                .get_column(columns)
+                .cast(pl.Utf8)
+                .fill_null("null")
+                .to_list()
+                if shard_files
+                else []
+            )
+
+            pivoted_paths = []
+            row_bytes = 1
+            for part, files in enumerate(shards):
+                if not files:
+                    continue
+                long_df = pl.read_parquet(files, hive_partitioning=False)
+                for path in files:
+                    os.remove(path)
+                if long_df.height == 0:
+                    continue
+
+                value_dtype = long_df.schema[values]
+                order = long_df.group_by(index, maintain_order=True).agg(
+                    pl.col("__order__").min()
+                )
+                pivoted = pivot_eager(
+                    frame=long_df.drop("__order__"),
+                    index=index,
+                    columns=columns,
+                    values=values,
+                    aggregate_function=aggregate_function,
+                )
+                del long_df
+
+                pivoted = pivoted.join(
+                    order, on=index, how="left", nulls_equal=True
+                ).sort("__order__")
+                missing = [name for name in series_order if name not in pivoted.columns]
+                if missing:
+                    pivoted = pivoted.with_columns(
+                        [pl.lit(None, dtype=value_dtype).alias(name) for name in missing]
+                    )
+                pivoted = pivoted.select(index + series_order + ["__order__"])
+                row_bytes = max(row_bytes, pivoted.estimated_size() // max(1, pivoted.height))
+                pivoted_path = os.path.join(work_dir, "wide-{:03d}.parquet".format(part))
+                pivoted.write_parquet(pivoted_path)
+                pivoted_paths.append(pivoted_path)
+                del pivoted, order
+                gc.collect()
+
+            if not pivoted_paths:
+                return pivot_eager(
+                    frame=frame,
+                    index=index,
+                    columns=columns,
+                    values=values,
+                    aggregate_function=aggregate_function,
+                )
+
+            batch_rows = DEFAULT_EXPORT_BATCH_BYTES // (row_bytes * len(pivoted_paths))
+            merged_paths = merge_ordered_shards(
+                pivoted_paths, "__order__", work_dir, max(1, batch_rows)
+            )
+            for path in pivoted_paths:
+                os.remove(path)
+
+            result = pl.scan_parquet(merged_paths)
+            if temp_paths is None:
+                return collect_frame(result)
+            temp_paths.append(work_dir)
+            keep_work_dir = True
+            return result
+        finally:
+            if not keep_work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
 
 
 def process_header_series_wide_layout(
@@ -685,7 +1929,10 @@ def process_header_series_wide_layout(
     min_free_ram_mb: int,
     safe_mode: bool,
     raw_columns_by_name: Optional[Dict[str, str]] = None,
-) -> pl.DataFrame:
+    spill_dir: Optional[str] = None,
+    float32: bool = False,
+    temp_paths: Optional[List[str]] = None,
+) -> FrameLike:
     actual_id_var = resolve_id_column(frame, id_var)
 
     header_cols = []
@@ -704,89 +1951,72 @@ def process_header_series_wide_layout(
     frame = frame.select([actual_id_var] + header_cols)
 
     estimated_unpivot_multiplier = max(2.0, min(8.0, len(header_cols) / 4))
-    ensure_memory_headroom(
+    with memory_stage(
         stage="unpivot",
         input_size_bytes=file_size,
         multiplier=estimated_unpivot_multiplier,
         minimum_free_mb=min_free_ram_mb,
         safe_mode=safe_mode,
-    )
-
-    frame = frame.unpivot(
-        index=[actual_id_var],
-        on=header_cols,
-        variable_name="__Header__",
-        value_name="Value",
-    )
-
-    if raw_columns_by_name:
-        frame = frame.with_columns(
-            pl.col("__Header__")
-            .map_elements(
-                lambda value: raw_columns_by_name.get(value, value),
-                return_dtype=pl.Utf8,
+    ):
+        with profile_stage("unpivot") as stage:
+            frame = frame.unpivot(
+                index=[actual_id_var],
+                on=header_cols,
+                variable_name="__Header__",
+                value_name="Value",
             )
-            .alias("__Raw_Header__")
+            profile_frame(stage, frame)
+
+    with profile_stage("cast") as stage:
+        header_dtype = pl.Enum(header_cols)
+        lookup = header_series_lookup(header_cols, raw_columns_by_name, header_dtype)
+        frame = join_preserving_order(
+            frame.with_columns(pl.col("__Header__").cast(header_dtype)),
+            lookup.lazy() if isinstance(frame, pl.LazyFrame) else lookup,
+            on="__Header__",
+        ).drop("__Header__")
+        frame = frame.with_columns(
+            pl.col(actual_id_var).cast(pl.Utf8).cast(pl.Categorical),
+            cast_value_expr("Value", float32),
         )
-    else:
-        frame = frame.with_columns(pl.col("__Header__").alias("__Raw_Header__"))
-
-    frame = frame.with_columns(
-        [
-            pl.col("__Raw_Header__")
-            .str.extract(HEADER_SERIES_PATTERN.pattern, group_index=1)
-            .cast(pl.Int32, strict=False)
-            .alias("Year"),
-            pl.col("__Raw_Header__")
-            .str.extract(HEADER_SERIES_PATTERN.pattern, group_index=2)
-            .alias("Series"),
-            pl.col("__Raw_Header__")
-            .str.extract(HEADER_SERIES_PATTERN.pattern, group_index=3)
-            .alias("Series_Code"),
-        ]
-    ).drop(["__Header__", "__Raw_Header__"])
-
-    frame = cast_year_and_value(frame, year_col="Year", value_col="Value")
+        profile_frame(stage, frame)
 
+    est_bytes = estimate_pivot_bytes(frame, [actual_id_var, "Year"], "Series_Key")
     if not should_allow_pivot(
-        frame=frame,
-        fallback_bytes=file_size,
+        est_bytes=est_bytes,
         min_free_ram_mb=min_free_ram_mb,
         safe_mode=safe_mode,
     ):
-        print("Info: Skipping eager pivot due to memory guard; keeping long-form panel.")
-        ordered_cols = [actual_id_var, "Year", "Series", "Series_Code", "Value"]
-        ordered_cols = [col for col in ordered_cols if col in get_columns(frame)]
-        return collect_frame(frame.select(ordered_cols))
+        pivoted = pivot_partitioned(
+            frame=frame,
+            index=[actual_id_var, "Year"],
+            columns="Series_Key",
+            values="Value",
+            est_bytes=est_bytes,
+            min_free_ram_mb=min_free_ram_mb,
+            safe_mode=safe_mode,
+            spill_dir=spill_dir,
+            temp_paths=temp_paths,
+        )
+        columns = get_columns(pivoted)
+        return pivoted.rename(dict(zip(columns, sanitise(columns))))
 
-    ensure_memory_headroom(
+    with memory_stage(
         stage="pivot",
-        input_size_bytes=estimate_frame_bytes(frame, fallback_bytes=file_size),
+        input_size_bytes=est_bytes,
         multiplier=3.0 if safe_mode else 2.5,
         minimum_free_mb=max(
             min_free_ram_mb, 1024 if safe_mode else min_free_ram_mb
         ),
         safe_mode=safe_mode,
-    )
-
-    frame = frame.with_columns(
-        pl.when(pl.col("Series_Code").is_not_null() & (pl.col("Series_Code") != ""))
-        .then(
-            pl.concat_str(
-                [pl.col("Series"), pl.lit(" ["), pl.col("Series_Code"), pl.lit("]")]
-            )
+    ):
+        pivoted = pivot_eager(
+            frame=frame,
+            index=[actual_id_var, "Year"],
+            columns="Series_Key",
+            values="Value",
+            aggregate_function="mean",
         )
-        .otherwise(pl.col("Series"))
-        .alias("Series_Key")
-    )
-
-    pivoted = pivot_eager(
-        frame=frame,
-        index=[actual_id_var, "Year"],
-        columns="Series_Key",
-        values="Value",
-        aggregate_function="mean",
-    )
     pivoted = pivoted.rename(dict(zip(pivoted.columns, sanitise(pivoted.columns))))
     return pivoted
 
@@ -798,7 +2028,11 @@ def process_wide_layout(
     series_col_arg: Optional[str],
     min_free_ram_mb: int,
     safe_mode: bool,
-) -> pl.DataFrame:
+    spill_dir: Optional[str] = None,
+    float32: bool = False,
+    keep_lazy: bool = False,
+    temp_paths: Optional[List[str]] = None,
+) -> FrameLike:
     columns = get_columns(frame)
 
     drop_candidates = [c for c in ("Country_Code", "Series_Code") if c in columns]
@@ -832,21 +2066,25 @@ def process_wide_layout(
     frame = frame.select(id_vars + value_vars)
 
     estimated_unpivot_multiplier = max(2.0, min(8.0, len(value_vars) / 4))
-    ensure_memory_headroom(
+    with memory_stage(
         stage="unpivot",
         input_size_bytes=file_size,
         multiplier=estimated_unpivot_multiplier,
         minimum_free_mb=min_free_ram_mb,
         safe_mode=safe_mode,
-    )
+    ):
+        with profile_stage("unpivot") as stage:
+            frame = frame.unpivot(
+                index=id_vars,
+                on=value_vars,
+                variable_name="Year",
+                value_name="Value",
+            )
+            profile_frame(stage, frame)
 
-    frame = frame.unpivot(
-        index=id_vars,
-        on=value_vars,
-        variable_name="Year",
-        value_name="Value",
+    frame = cast_year_and_value(
+        frame, year_col="Year", value_col="Value", key_cols=id_vars, float32=float32
     )
-    frame = cast_year_and_value(frame, year_col="Year", value_col="Value")
 
     if series_col and series_col in get_columns(frame):
         if safe_mode and get_available_ram_mb() < max(2048, min_free_ram_mb * 2):
@@ -854,35 +2092,45 @@ def process_wide_layout(
                 "Refusing pivot in --safe-mode: insufficient RAM headroom for eager pivot."
             )
 
+        est_bytes = estimate_pivot_bytes(frame, [actual_id_var, "Year"], series_col)
         if not should_allow_pivot(
-            frame=frame,
-            fallback_bytes=file_size,
+            est_bytes=est_bytes,
             min_free_ram_mb=min_free_ram_mb,
             safe_mode=safe_mode,
         ):
-            print("Info: Skipping eager pivot due to memory guard; keeping long-form panel.")
-            return collect_frame(frame.rename({series_col: "Series"}))
+            pivoted = pivot_partitioned(
+                frame=frame.rename({series_col: "Series"}),
+                index=[actual_id_var, "Year"],
+                columns="Series",
+                values="Value",
+                est_bytes=est_bytes,
+                min_free_ram_mb=min_free_ram_mb,
+                safe_mode=safe_mode,
+                spill_dir=spill_dir,
+                temp_paths=temp_paths,
+            )
+            columns = get_columns(pivoted)
+            return pivoted.rename(dict(zip(columns, sanitise(columns))))
 
-        ensure_memory_headroom(
+        with memory_stage(
             stage="pivot",
-            input_size_bytes=estimate_frame_bytes(frame, fallback_bytes=file_size),
+            input_size_bytes=est_bytes,
             multiplier=3.5 if safe_mode else 3.0,
             minimum_free_mb=max(min_free_ram_mb, 1024),
             safe_mode=safe_mode,
-        )
-
-        frame = frame.rename({series_col: "Series"})
-        pivoted = pivot_eager(
-            frame=frame,
-            index=[actual_id_var, "Year"],
-            columns="Series",
-            values="Value",
-            aggregate_function="mean",
-        )
+        ):
+            frame = frame.rename({series_col: "Series"})
+            pivoted = pivot_eager(
+                frame=frame,
+                index=[actual_id_var, "Year"],
+                columns="Series",
+                values="Value",
+                aggregate_function="mean",
+            )
         pivoted = pivoted.rename(dict(zip(pivoted.columns, sanitise(pivoted.columns))))
         return pivoted
 
-    return collect_frame(frame)
+    return frame if keep_lazy else collect_frame(frame)
 
 
 def process_long_layout(
@@ -894,7 +2142,11 @@ def process_long_layout(
     series_col_arg: Optional[str],
     min_free_ram_mb: int,
     safe_mode: bool,
-) -> pl.DataFrame:
+    spill_dir: Optional[str] = None,
+    float32: bool = False,
+    keep_lazy: bool = False,
+    temp_paths: Optional[List[str]] = None,
+) -> FrameLike:
     columns = get_columns(frame)
     drop_candidates = [c for c in ("Country_Code", "Series_Code") if c in columns]
     if drop_candidates:
@@ -936,38 +2188,55 @@ def process_long_layout(
     if series_col and series_col != "Series":
         frame = frame.rename({series_col: "Series"})
 
-    frame = cast_year_and_value(frame, year_col="Year", value_col="Value")
+    frame = cast_year_and_value(
+        frame,
+        year_col="Year",
+        value_col="Value",
+        key_cols=[c for c in (actual_id_var, "Series") if c in get_columns(frame)],
+        float32=float32,
+    )
 
     if "Series" in get_columns(frame):
+        est_bytes = estimate_pivot_bytes(frame, [actual_id_var, "Year"], "Series")
         if not should_allow_pivot(
-            frame=frame,
-            fallback_bytes=file_size,
+            est_bytes=est_bytes,
             min_free_ram_mb=min_free_ram_mb,
             safe_mode=safe_mode,
         ):
-            print("Info: Skipping eager pivot due to memory guard; keeping long-form panel.")
-            return collect_frame(frame)
+            pivoted = pivot_partitioned(
+                frame=frame,
+                index=[actual_id_var, "Year"],
+                columns="Series",
+                values="Value",
+                est_bytes=est_bytes,
+                min_free_ram_mb=min_free_ram_mb,
+                safe_mode=safe_mode,
+                spill_dir=spill_dir,
+                temp_paths=temp_paths,
+            )
+            columns = get_columns(pivoted)
+            return pivoted.rename(dict(zip(columns, sanitise(columns))))
 
-        ensure_memory_headroom(
+        with memory_stage(
             stage="pivot",
-            input_size_bytes=estimate_frame_bytes(frame, fallback_bytes=file_size),
+            input_size_bytes=est_bytes,
             multiplier=3.0 if safe_mode else 2.5,
             minimum_free_mb=max(
                 min_free_ram_mb, 1024 if safe_mode else min_free_ram_mb
             ),
             safe_mode=safe_mode,
-        )
-        pivoted = pivot_eager(
-            frame=frame,
-            index=[actual_id_var, "Year"],
-            columns="Series",
-            values="Value",
-            aggregate_function="mean",
-        )
+        ):
+            pivoted = pivot_eager(
+                frame=frame,
+                index=[actual_id_var, "Year"],
+                columns="Series",
+                values="Value",
+                aggregate_function="mean",
+            )
         pivoted = pivoted.rename(dict(zip(pivoted.columns, sanitise(pivoted.columns))))
         return pivoted
 
-    return collect_frame(frame)
+    return frame if keep_lazy else collect_frame(frame)
 
 
 def process_year_rows_layout(
@@ -977,7 +2246,9 @@ def process_year_rows_layout(
     year_col_arg: Optional[str],
     min_free_ram_mb: int,
     safe_mode: bool,
-) -> pl.DataFrame:
+    float32: bool = False,
+    keep_lazy: bool = False,
+) -> FrameLike:
     year_col = resolve_column_name(
         frame,
         requested=year_col_arg,
@@ -993,26 +2264,126 @@ def process_year_rows_layout(
     frame = frame.select([year_col] + value_vars)
 
     estimated_unpivot_multiplier = max(2.0, min(8.0, len(value_vars) / 4))
-    ensure_memory_headroom(
+    with memory_stage(
         stage="unpivot",
         input_size_bytes=file_size,
         multiplier=estimated_unpivot_multiplier,
         minimum_free_mb=min_free_ram_mb,
         safe_mode=safe_mode,
-    )
-
-    frame = frame.unpivot(
-        index=[year_col],
-        on=value_vars,
-        variable_name=output_id_var,
-        value_name="Value",
-    )
+    ):
+        with profile_stage("unpivot") as stage:
+            frame = frame.unpivot(
+                index=[year_col],
+                on=value_vars,
+                variable_name=output_id_var,
+                value_name="Value",
+            )
+            profile_frame(stage, frame)
 
     if year_col != "Year":
         frame = frame.rename({year_col: "Year"})
 
-    frame = cast_year_and_value(frame, year_col="Year", value_col="Value")
-    return collect_frame(frame)
+    frame = cast_year_and_value(
+        frame,
+        year_col="Year",
+        value_col="Value",
+        key_cols=[output_id_var],
+        float32=float32,
+    )
+    return frame if keep_lazy else collect_frame(frame)
+
+
+def sanitise_source(frame: FrameLike) -> Tuple[FrameLike, Dict[str, str]]:
+    with profile_stage("sanitise") as stage:
+        original_cols = get_columns(frame)
+        sanitised_cols = sanitise(original_cols)
+        raw_columns_by_name = dict(zip(sanitised_cols, original_cols))
+        frame = frame.rename(dict(zip(original_cols, sanitised_cols)))
+        profile_frame(stage, frame)
+    return frame, raw_columns_by_name
+
+
+def remove_temp_file(path: Optional[str]) -> None:
+    if path and os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+
+def reshape_frame(
+    frame: FrameLike,
+    chosen_layout: str,
+    file_size: int,
+    id_var: str,
+    year_col: Optional[str],
+    value_col: Optional[str],
+    series_col: Optional[str],
+    min_free_ram_mb: int,
+    safe_mode: bool,
+    raw_columns_by_name: Dict[str, str],
+    spill_dir: Optional[str] = None,
+    float32: bool = False,
+    keep_lazy: bool = False,
+    temp_paths: Optional[List[str]] = None,
+) -> FrameLike:
+    if chosen_layout == "wide_header_series":
+        df = process_header_series_wide_layout(
+            frame=frame,
+            file_size=file_size,
+            id_var=id_var,
+            min_free_ram_mb=min_free_ram_mb,
+            safe_mode=safe_mode,
+            raw_columns_by_name=raw_columns_by_name,
+            spill_dir=spill_dir,
+            float32=float32,
+            temp_paths=temp_paths,
+        )
+    elif chosen_layout == "wide":
+        df = process_wide_layout(
+            frame=frame,
+            file_size=file_size,
+            id_var=id_var,
+            series_col_arg=series_col,
+            min_free_ram_mb=min_free_ram_mb,
+            safe_mode=safe_mode,
+            spill_dir=spill_dir,
+            float32=float32,
+            keep_lazy=keep_lazy,
+            temp_paths=temp_paths,
+        )
+    elif chosen_layout == "long":
+        df = process_long_layout(
+            frame=frame,
+            file_size=file_size,
+            id_var=id_var,
+            year_col_arg=year_col,
+            value_col_arg=value_col,
+            series_col_arg=series_col,
+            min_free_ram_mb=min_free_ram_mb,
+            safe_mode=safe_mode,
+            spill_dir=spill_dir,
+            float32=float32,
+            keep_lazy=keep_lazy,
+            temp_paths=temp_paths,
+        )
+    elif chosen_layout == "year_rows":
+        df = process_year_rows_layout(
+            frame=frame,
+            file_size=file_size,
+            id_var=id_var,
+            year_col_arg=year_col,
+            min_free_ram_mb=min_free_ram_mb,
+            safe_mode=safe_mode,
+            float32=float32,
+            keep_lazy=keep_lazy,
+        )
+    else:
+        raise ValueError("Unsupported layout: {}".format(chosen_layout))
+
+    return widen_key_dtypes(df)
 
 
 def process_file(
@@ -1030,25 +2401,34 @@ def process_file(
     header_row_override: Optional[int],
     reshape_heavy: bool = False,
     multi_export: bool = False,
-) -> pl.DataFrame:
-    file_size = os.path.getsize(path)
-    frame, temp_parquet_path, _policy = read_source(
-        path=path,
-        lazy_thresh_mb=lazy_thresh,
-        parquet_thresh_mb=parquet_thresh,
-        safe_mode=safe_mode,
-        delimiter=delimiter,
-        header_row_override=header_row_override,
-        reshape_heavy=reshape_heavy,
-        multi_export=multi_export,
-    )
+    store_dir: Optional[str] = None,
+    store_size_mb: int = DEFAULT_INTERMEDIATE_SIZE_MB,
+    sheet: Optional[str] = None,
+    float32: bool = False,
+    sink_path: Optional[str] = None,
+    temp_paths: Optional[List[str]] = None,
+    keep_lazy: bool = False,
+) -> FrameLike:
+    file_size = source_size(path)
+    with profile_stage("source read", input_bytes=file_size) as stage:
+        frame, temp_parquet_path, policy = read_source(
+            path=path,
+            lazy_thresh_mb=lazy_thresh,
+            parquet_thresh_mb=parquet_thresh,
+            safe_mode=safe_mode,
+            delimiter=delimiter,
+            header_row_override=header_row_override,
+            reshape_heavy=reshape_heavy,
+            multi_export=multi_export,
+            store_dir=store_dir,
+            store_size_mb=store_size_mb,
+            sheet=sheet,
+        )
+        stage["policy"] = policy
+        profile_frame(stage, frame)
 
     try:
-        original_cols = get_columns(frame)
-        sanitised_cols = sanitise(original_cols)
-        raw_columns_by_name = dict(zip(sanitised_cols, original_cols))
-        frame = frame.rename(dict(zip(original_cols, sanitised_cols)))
-
+        frame, raw_columns_by_name = sanitise_source(frame)
         chosen_layout = detect_layout(
             frame,
             layout,
@@ -1056,185 +2436,2118 @@ def process_file(
             value_col,
             raw_columns_by_name=raw_columns_by_name,
         )
-        print("Info: Using layout '{}'.".format(chosen_layout))
-
-        if chosen_layout == "wide_header_series":
-            return process_header_series_wide_layout(
-                frame=frame,
-                file_size=file_size,
-                id_var=id_var,
-                min_free_ram_mb=min_free_ram_mb,
-                safe_mode=safe_mode,
-                raw_columns_by_name=raw_columns_by_name,
-            )
-
-        if chosen_layout == "wide":
-            return process_wide_layout(
-                frame=frame,
-                file_size=file_size,
-                id_var=id_var,
-                series_col_arg=series_col,
-                min_free_ram_mb=min_free_ram_mb,
-                safe_mode=safe_mode,
-            )
-
-        if chosen_layout == "long":
-            return process_long_layout(
-                frame=frame,
-                file_size=file_size,
-                id_var=id_var,
-                year_col_arg=year_col,
-                value_col_arg=value_col,
-                series_col_arg=series_col,
-                min_free_ram_mb=min_free_ram_mb,
-                safe_mode=safe_mode,
-            )
-
-        if chosen_layout == "year_rows":
-            return process_year_rows_layout(
-                frame=frame,
-                file_size=file_size,
-                id_var=id_var,
-                year_col_arg=year_col,
-                min_free_ram_mb=min_free_ram_mb,
-                safe_mode=safe_mode,
-            )
+        MEMORY_MODEL["layout"] = chosen_layout
+        report("Info: Using layout '{}'.".format(chosen_layout))
 
-        raise ValueError("Unsupported layout: {}".format(chosen_layout))
-    finally:
-        if temp_parquet_path and os.path.exists(temp_parquet_path):
+        df = reshape_frame(
+            frame=frame,
+            chosen_layout=chosen_layout,
+            file_size=file_size,
+            id_var=id_var,
+            year_col=year_col,
+            value_col=value_col,
+            series_col=series_col,
+            min_free_ram_mb=min_free_ram_mb,
+            safe_mode=safe_mode,
+            raw_columns_by_name=raw_columns_by_name,
+            spill_dir=os.path.dirname(os.path.abspath(path)),
+            float32=float32,
+            keep_lazy=keep_lazy or sink_path is not None,
+            temp_paths=temp_paths,
+        )
+        if not isinstance(df, pl.LazyFrame) or sink_path is None:
+            lazy_source = isinstance(df, pl.LazyFrame) and temp_parquet_path
+            if lazy_source and temp_paths is not None:
+                temp_paths.append(temp_parquet_path)
+                temp_parquet_path = None
+            return df
+
+        # The plan may still read the intermediate, so it is sunk before cleanup.
+        report("Info: Streaming the panel to {}.".format(sink_path))
+        with profile_stage("sink parquet") as stage:
+            export_df = prepare_export_df(df)
+            profile_frame(stage, export_df)
             try:
-                os.remove(temp_parquet_path)
-            except Exception:
-                pass
+                export_df.sink_parquet(sink_path, compression="zstd")
+            except BaseException:
+                remove_temp_file(sink_path)
+                raise
+            stage["output_bytes"] = os.path.getsize(sink_path)
+        return pl.scan_parquet(sink_path)
+    finally:
+        remove_temp_file(temp_parquet_path)
 
 
-def prepare_export_df(df: pl.DataFrame) -> pl.DataFrame:
+def prepare_export_df(df: FrameLike) -> FrameLike:
     export_df = df
+    columns = get_columns(export_df)
 
-    if "Country" in export_df.columns and "Country_Name" in export_df.columns:
+    if "Country" in columns and "Country_Name" in columns:
         export_df = export_df.drop("Country_Name")
-    elif "Country_Name" in export_df.columns:
+    elif "Country_Name" in columns:
         export_df = export_df.rename({"Country_Name": "Country"})
+    columns = get_columns(export_df)
 
-    if "Year" not in export_df.columns:
-        for col in export_df.columns:
+    if "Year" not in columns:
+        for col in columns:
             if str(col).lower() in {"year", "time", "date"}:
                 export_df = export_df.rename({col: "Year"})
                 break
+        columns = get_columns(export_df)
 
-    preferred = [c for c in ("Country", "Year") if c in export_df.columns]
-    rest = [c for c in export_df.columns if c not in preferred]
+    preferred = [c for c in ("Country", "Year") if c in columns]
+    rest = [c for c in columns if c not in preferred]
     if preferred:
         export_df = export_df.select(preferred + rest)
 
     return export_df
 
 
-def normalise_time_column_name(pdf):
-    for col in list(pdf.columns):
-        lowered = str(col).lower()
-        if lowered in {"year", "time", "date"}:
-            if col != "Year":
-                pdf = pdf.rename(columns={col: "Year"})
-            return pdf
-    return pdf
+def normalise_time_column_name(columns: List[str]) -> List[str]:
+    names = list(columns)
+    for i, col in enumerate(names):
+        if str(col).lower() in {"year", "time", "date"}:
+            names[i] = "Year"
+            break
+    return names
 
 
-def preview_output(df: pl.DataFrame, rows: int = DEFAULT_PREVIEW_ROWS) -> None:
+def preview_output(df: FrameLike, rows: int = DEFAULT_PREVIEW_ROWS) -> None:
     export_df = prepare_export_df(df)
+    height = int(collect_frame(export_df.lazy().select(pl.len())).item())
+    columns = get_columns(export_df)
 
     print("\n=== Preview of export data ===")
-    print("Rows: {}".format(export_df.height))
-    print("Columns: {}".format(len(export_df.columns)))
+    print("Rows: {}".format(height))
+    print("Columns: {}".format(len(columns)))
     print("Column names:")
-    print(", ".join(export_df.columns))
-    print("\nFirst {} rows:".format(min(rows, export_df.height)))
-    print(export_df.head(rows))
+    print(", ".join(columns))
+    print("\nFirst {} rows:".format(min(rows, height)))
+    print(collect_frame(export_df.lazy().head(rows)))
     print("=== End preview ===\n")
 
 
-def write(
-    export_df: pl.DataFrame,
-    base: str,
-    fmt: str,
-    stata_version: int,
-    overwrite: bool = False,
-    min_free_ram_mb: int = DEFAULT_MIN_FREE_RAM_MB,
-    safe_mode: bool = False,
-) -> None:
-    output_path = "{}.{}".format(base, fmt)
+def pad_bytes(value: bytes, length: int) -> bytes:
+    return value[: length - 1].ljust(length, b"\x00")
 
-    if os.path.exists(output_path) and not overwrite:
-        print("Skipping {}: file already exists. Use --overwrite.".format(output_path))
-        return
 
-    estimated_df_bytes = max(export_df.estimated_size(), 1)
+def stata_timestamp() -> bytes:
+    now = time.localtime()
+    return "{:02d} {} {:04d} {:02d}:{:02d}".format(
+        now.tm_mday, STATA_MONTHS[now.tm_mon - 1], now.tm_year, now.tm_hour, now.tm_min
+    ).encode("ascii")
 
-    if (
-        safe_mode
-        and fmt == "rdata"
-        and get_available_ram_mb() < max(2048, min_free_ram_mb * 2)
-    ):
-        raise MemoryError(
-            "Refusing export to {} in --safe-mode: insufficient RAM for conversion.".format(
-                fmt
+
+def stata_numeric_type(
+    dtype: pl.DataType,
+    low,
+    high,
+    compress: bool = False,
+    integral: bool = False,
+    fits_float: bool = False,
+) -> str:
+    fallback = "double"
+    if dtype.is_float():
+        if dtype == pl.Float32 or (compress and fits_float):
+            fallback = "float"
+        candidates = ["byte", "int", "long"] if compress and integral else []
+    elif compress or dtype == pl.Boolean or dtype == pl.Int8:
+        candidates = ["byte", "int", "long"]
+    elif dtype in (pl.UInt8, pl.Int16):
+        candidates = ["int", "long"]
+    else:
+        candidates = ["long"]
+
+    for name in candidates:
+        spec = STATA_NUMERIC_TYPES[name]
+        if low is None or (spec["min"] <= low and high <= spec["max"]):
+            return name
+    return fallback
+
+
+def stata_column_specs(
+    frame: FrameLike, release: int, compress: bool = False
+) -> Tuple[int, List[Tuple[str, str, int]]]:
+    schema = frame.collect_schema() if isinstance(frame, pl.LazyFrame) else frame.schema
+    encoding_bytes = release >= 118
+
+    aggregates = [pl.len().alias("__rows__")]
+    for i, (name, dtype) in enumerate(schema.items()):
+        col = pl.col(name)
+        if dtype.is_integer() or dtype == pl.Boolean:
+            col = col.cast(pl.Int64, strict=False)
+            aggregates.append(col.min().alias("__min_{}".format(i)))
+            aggregates.append(col.max().alias("__max_{}".format(i)))
+        elif dtype.is_float() and compress:
+            col = col.cast(pl.Float64).fill_nan(None)
+            float_limit = STATA_NUMERIC_TYPES["float"]["missing"]
+            aggregates.extend(
+                [
+                    col.min().alias("__min_{}".format(i)),
+                    col.max().alias("__max_{}".format(i)),
+                    (col == col.round(0)).all().alias("__int_{}".format(i)),
+                    (
+                        (col.cast(pl.Float32).cast(pl.Float64) == col)
+                        & (col.abs() < float_limit)
+                    )
+                    .all()
+                    .alias("__f32_{}".format(i)),
+                ]
             )
-        )
+        elif not dtype.is_float():
+            col = col.cast(pl.Utf8, strict=False)
+            length = col.str.len_bytes() if encoding_bytes else col.str.len_chars()
+            aggregates.append(length.max().alias("__len_{}".format(i)))
+
+    stats = collect_frame(frame.lazy().select(aggregates)).row(0, named=True)
+
+    specs: List[Tuple[str, str, int]] = []
+    for i, (name, dtype) in enumerate(schema.items()):
+        if "__len_{}".format(i) in stats:
+            width = max(1, int(stats["__len_{}".format(i)] or 0))
+            if width > STATA_MAX_STR[release]:
+                raise ValueError(
+                    "Column '{}' holds strings longer than {} bytes (.dta {}).".format(
+                        name, STATA_MAX_STR[release], release
+                    )
+                )
+            specs.append((name, "str", width))
+        else:
+            kind = stata_numeric_type(
+                dtype,
+                stats.get("__min_{}".format(i)),
+                stats.get("__max_{}".format(i)),
+                compress=compress,
+                integral=bool(stats.get("__int_{}".format(i))),
+                fits_float=bool(stats.get("__f32_{}".format(i))),
+            )
+            specs.append((name, kind, 0))
 
-    ensure_memory_headroom(
-        stage="export to {}".format(fmt),
-        input_size_bytes=estimated_df_bytes,
-        multiplier=3.0 if fmt == "rdata" else 1.5,
-        minimum_free_mb=max(
-            min_free_ram_mb, 1024 if fmt == "rdata" else min_free_ram_mb
-        ),
-        safe_mode=safe_mode,
-    )
+    return int(stats["__rows__"]), specs
 
-    try:
-        if fmt == "dta":
-            try:
-                pyreadstat.write_dta(export_df, output_path, version=stata_version)
-            except TypeError:
-                pyreadstat.write_dta(
-                    export_df.to_pandas(), output_path, version=stata_version
-                )
-        elif fmt == "sav":
-            try:
-                pyreadstat.write_sav(export_df, output_path)
-            except TypeError:
-                pyreadstat.write_sav(export_df.to_pandas(), output_path)
-        elif fmt == "rdata":
-            pdf = normalise_time_column_name(export_df.to_pandas())
-            try:
-                with localconverter(ro.default_converter + pandas2ri.converter):
-                    ro.globalenv["df"] = pdf
-                ro.globalenv["outfile"] = output_path
-                ro.r("save(df, file=outfile)")
-            finally:
-                del pdf
-                gc.collect()
+
+def stata_variable_names(columns: List[str]) -> List[str]:
+    seen = {name for name in columns if len(name) <= STATA_MAX_NAME}
+    out = []
+
+    for name in columns:
+        if len(name) <= STATA_MAX_NAME:
+            out.append(name)
+            continue
+
+        col = name[:STATA_MAX_NAME].rstrip("_") or "v"
+        base = col
+        i = 1
+        while col in seen:
+            suffix = "_{}".format(i)
+            col = "{}{}".format(base[: STATA_MAX_NAME - len(suffix)], suffix)
+            i += 1
+
+        seen.add(col)
+        out.append(col)
+
+    return out
+
+
+def stata_record_dtype(specs: List[Tuple[str, str, int]]):
+    import numpy as np
+
+    fields = []
+    for i, (_name, kind, width) in enumerate(specs):
+        if kind == "str":
+            fields.append((str(i), "S{}".format(width)))
+        else:
+            fields.append((str(i), STATA_NUMERIC_TYPES[kind]["np"]))
+    return np.dtype(fields)
+
+
+def stata_batch_bytes(
+    batch: pl.DataFrame,
+    specs: List[Tuple[str, str, int]],
+    record_dtype,
+    encoding: str,
+) -> bytes:
+    import numpy as np
+
+    records = np.zeros(batch.height, dtype=record_dtype)
+    for i, (name, kind, _width) in enumerate(specs):
+        column = batch.get_column(name)
+        if kind == "str":
+            values = column.cast(pl.Utf8, strict=False).fill_null("").to_numpy()
+            records[str(i)] = np.char.encode(values.astype("U"), encoding, "replace")
+            continue
+
+        spec = STATA_NUMERIC_TYPES[kind]
+        column = column.cast(getattr(pl, spec["pl"]), strict=False)
+        if kind in {"float", "double"}:
+            column = column.fill_nan(None)
+        records[str(i)] = column.fill_null(spec["missing"]).to_numpy()
+
+    return records.tobytes()
+
+
+def stata_entity_labels(frame: FrameLike) -> Dict[str, List[str]]:
+    schema = frame.collect_schema() if isinstance(frame, pl.LazyFrame) else frame.schema
+    entity = next((name for name in schema if name != "Year"), None)
+    if entity is None or schema[entity].is_numeric() or schema[entity] == pl.Boolean:
+        return {}
+
+    values = collect_frame(
+        frame.lazy().select(pl.col(entity).cast(pl.Utf8).drop_nulls().unique().sort())
+    ).to_series()
+    return {entity: values.to_list()} if values.len() else {}
+
+
+def stata_value_label_bytes(
+    name: str, labels: List[str], encoding: str, name_len: int, release: int
+) -> bytes:
+    texts = [label.encode(encoding, "replace") + b"\x00" for label in labels]
+    offsets = list(itertools.accumulate(len(text) for text in texts[:-1]))
+    count = len(labels)
+    table = (
+        struct.pack("<ii", count, sum(len(text) for text in texts))
+        + struct.pack("<{}i".format(count), 0, *offsets)
+        + struct.pack("<{}i".format(count), *range(1, count + 1))
+        + b"".join(texts)
+    )
+    payload = (
+        struct.pack("<i", len(table))
+        + pad_bytes(name.encode(encoding), name_len)
+        + b"\x00" * 3
+        + table
+    )
+    return b"<lbl>" + payload + b"</lbl>" if release >= 117 else payload
+
+
+def write_dta_stream(
+    source: Union[FrameLike, str],
+    output_path: str,
+    stata_version: int,
+    batch_bytes: int = DEFAULT_EXPORT_BATCH_BYTES,
+    compress: bool = True,
+    encode_entity: bool = False,
+) -> int:
+    frame = pl.scan_parquet(source) if isinstance(source, str) else source
+    release = STATA_RELEASES[stata_version]
+    encoding = "utf-8" if release >= 118 else "latin-1"
+    with profile_stage("stata storage types", compress=compress) as stage:
+        value_labels = stata_entity_labels(frame) if encode_entity else {}
+        for name, labels in value_labels.items():
+            frame = frame.with_columns(
+                pl.col(name)
+                .cast(pl.Utf8)
+                .replace_strict(
+                    labels,
+                    list(range(1, len(labels) + 1)),
+                    default=None,
+                    return_dtype=pl.Int32,
+                )
+            )
+        nobs, specs = stata_column_specs(frame, release, compress=compress)
+        stage["types"] = dict(collections.Counter(kind for _name, kind, _width in specs))
+    names = [name for name, _kind, _width in specs]
+    # Names over Stata's limit are shortened; the full name becomes the label.
+    var_names = stata_variable_names(names)
+    record_dtype = stata_record_dtype(specs)
+    batch_rows = max(1, batch_bytes // max(1, record_dtype.itemsize))
+
+    type_codes: List[int] = []
+    formats: List[str] = []
+    for _name, kind, width in specs:
+        if kind == "str":
+            type_codes.append(width)
+            formats.append("%{}s".format(width))
+        else:
+            spec = STATA_NUMERIC_TYPES[kind]
+            type_codes.append(spec["old"] if release < 117 else spec["new"])
+            formats.append(spec["format"])
+    name_len = 129 if release >= 118 else 33
+    fmt_len = 57 if release >= 118 else 49
+    label_len = 321 if release >= 118 else 81
+    nvar = len(specs)
+    rows = 0
+    label_names = b"".join(
+        pad_bytes(var.encode(encoding) if name in value_labels else b"", name_len)
+        for name, var in zip(names, var_names)
+    )
+    label_tables = b"".join(
+        stata_value_label_bytes(var, value_labels[name], encoding, name_len, release)
+        for name, var in zip(names, var_names)
+        if name in value_labels
+    )
+    variable_labels = b"".join(
+        pad_bytes(name.encode(encoding, "replace") if name != var else b"", label_len)
+        for name, var in zip(names, var_names)
+    )
+
+    try:
+        with open(output_path, "wb") as handle:
+            if release < 117:
+                handle.write(struct.pack("<BBBBh", release, 2, 1, 0, nvar))
+                nobs_offset = handle.tell()
+                handle.write(struct.pack("<i", nobs))
+                handle.write(pad_bytes(b"", 81))
+                handle.write(pad_bytes(stata_timestamp(), 18))
+                handle.write(bytes(type_codes))
+                for name in var_names:
+                    handle.write(pad_bytes(name.encode(encoding), name_len))
+                handle.write(b"\x00" * 2 * (nvar + 1))
+                for fmt in formats:
+                    handle.write(pad_bytes(fmt.encode("ascii"), fmt_len))
+                handle.write(label_names)
+                handle.write(variable_labels)
+                handle.write(b"\x00" * 5)
+            else:
+                nobs_pack = "<I" if release == 117 else "<Q"
+                handle.write(b"<stata_dta><header>")
+                handle.write("<release>{}</release>".format(release).encode("ascii"))
+                handle.write(b"<byteorder>LSF</byteorder>")
+                handle.write(b"<K>" + struct.pack("<H", nvar) + b"</K><N>")
+                nobs_offset = handle.tell()
+                handle.write(struct.pack(nobs_pack, nobs) + b"</N>")
+                handle.write(b"<label>")
+                handle.write(struct.pack("<B" if release == 117 else "<H", 0))
+                handle.write(b"</label><timestamp>\x11" + stata_timestamp())
+                handle.write(b"</timestamp></header>")
+
+                offsets = {"stata_data": 0, "map": handle.tell()}
+                handle.write(b"<map>" + b"\x00" * 8 * 14 + b"</map>")
+
+                def section(tag: str, payload: bytes) -> None:
+                    offsets[tag] = handle.tell()
+                    handle.write("<{}>".format(tag).encode("ascii"))
+                    handle.write(payload)
+                    handle.write("</{}>".format(tag).encode("ascii"))
+
+                section("variable_types", struct.pack("<{}H".format(nvar), *type_codes))
+                section(
+                    "varnames",
+                    b"".join(pad_bytes(n.encode(encoding), name_len) for n in var_names),
+                )
+                section("sortlist", b"\x00" * 2 * (nvar + 1))
+                section(
+                    "formats",
+                    b"".join(pad_bytes(f.encode("ascii"), fmt_len) for f in formats),
+                )
+                section("value_label_names", label_names)
+                section("variable_labels", variable_labels)
+                section("characteristics", b"")
+                offsets["data"] = handle.tell()
+                handle.write(b"<data>")
+
+            for batch in iter_frame_batches(frame.select(names), batch_rows):
+                handle.write(stata_batch_bytes(batch, specs, record_dtype, encoding))
+                rows += batch.height
+
+            if release < 117:
+                handle.write(label_tables)
+            else:
+                handle.write(b"</data>")
+                section("strls", b"")
+                section("value_labels", label_tables)
+                offsets["stata_data_close"] = handle.tell()
+                handle.write(b"</stata_dta>")
+                offsets["end_of_file"] = handle.tell()
+                handle.seek(offsets["map"] + len(b"<map>"))
+                handle.write(
+                    struct.pack("<14Q", *[offsets[tag] for tag in STATA_MAP_TAGS])
+                )
+
+            if rows != nobs:
+                handle.seek(nobs_offset)
+                handle.write(struct.pack("<i" if release < 117 else nobs_pack, rows))
+    except BaseException:
+        if os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except Exception:
+                pass
+        raise
+
+    return rows
+
+
+def sav_column_specs(frame: FrameLike) -> Tuple[int, List[Tuple[str, str, int]]]:
+    schema = frame.collect_schema() if isinstance(frame, pl.LazyFrame) else frame.schema
+
+    aggregates = [pl.len().alias("__rows__")]
+    for i, (name, dtype) in enumerate(schema.items()):
+        if not (dtype.is_numeric() or dtype == pl.Boolean):
+            length = pl.col(name).cast(pl.Utf8, strict=False).str.len_bytes()
+            aggregates.append(length.max().alias("__len_{}".format(i)))
+
+    stats = collect_frame(frame.lazy().select(aggregates)).row(0, named=True)
+
+    specs: List[Tuple[str, str, int]] = []
+    for i, (name, dtype) in enumerate(schema.items()):
+        if "__len_{}".format(i) not in stats:
+            kind = "int" if dtype.is_integer() or dtype == pl.Boolean else "float"
+            specs.append((name, kind, 0))
+            continue
+
+        width = max(1, int(stats["__len_{}".format(i)] or 0))
+        if width > SAV_MAX_STR:
+            raise ValueError(
+                "Column '{}' holds strings longer than {} bytes (.sav).".format(
+                    name, SAV_MAX_STR
+                )
+            )
+        specs.append((name, "str", width))
+
+    return int(stats["__rows__"]), specs
+
+
+def sav_elements(kind: str, width: int) -> int:
+    return int(math.ceil(width / 8)) if kind == "str" else 1
+
+
+def sav_dictionary(
+    specs: List[Tuple[str, str, int]], nobs: int, compression: int
+) -> bytes:
+    case_size = sum(sav_elements(kind, width) for _name, kind, width in specs)
+    now = time.localtime()
+
+    out = io.BytesIO()
+    out.write(b"$FL3" if compression == SAV_COMPRESSION_ZLIB else b"$FL2")
+    out.write(b"@(#) SPSS DATA FILE dtabnk".ljust(60, b" "))
+    out.write(struct.pack("<iiiii", 2, case_size, compression, 0, nobs))
+    out.write(struct.pack("<d", SAV_BIAS))
+    out.write(
+        "{:02d} {} {:02d}".format(
+            now.tm_mday, STATA_MONTHS[now.tm_mon - 1], now.tm_year % 100
+        ).encode("ascii")
+    )
+    out.write(time.strftime("%H:%M:%S", now).encode("ascii"))
+    out.write(b" " * 64 + b"\x00" * 3)
+
+    long_names = []
+    for i, (name, kind, width) in enumerate(specs):
+        short_name = "V{}".format(i + 1)
+        long_names.append("{}={}".format(short_name, name))
+        if kind == "str":
+            var_type = width
+            fmt = (1 << 16) | (width << 8)
+        else:
+            var_type = 0
+            fmt = (5 << 16) | (8 << 8) | (0 if kind == "int" else 2)
+        out.write(struct.pack("<iiiiii", 2, var_type, 0, 0, fmt, fmt))
+        out.write(short_name.encode("ascii").ljust(8, b" "))
+        for _ in range(sav_elements(kind, width) - 1):
+            out.write(struct.pack("<iiiiii", 2, -1, 0, 0, 0, 0) + b" " * 8)
+
+    out.write(struct.pack("<iiii", 7, 3, 4, 8))
+    out.write(struct.pack("<8i", 1, 0, 0, -1, 1, 1, 2, 65001))
+    out.write(struct.pack("<iiii", 7, 4, 8, 3))
+    out.write(
+        struct.pack("<ddd", SAV_SYSMIS, sys.float_info.max, -sys.float_info.max)
+    )
+
+    names_blob = "\t".join(long_names).encode("utf-8")
+    out.write(struct.pack("<iiii", 7, 13, 1, len(names_blob)) + names_blob)
+    out.write(struct.pack("<iiii", 7, 20, 1, 5) + b"UTF-8")
+    out.write(struct.pack("<ii", 999, 0))
+    return out.getvalue()
+
+
+def sav_batch_words(batch: pl.DataFrame, specs: List[Tuple[str, str, int]]):
+    import numpy as np
+
+    offsets = []
+    case_size = 0
+    for _name, kind, width in specs:
+        offsets.append(case_size)
+        case_size += sav_elements(kind, width)
+
+    words = np.empty((batch.height, case_size), dtype="<u8")
+    numeric = np.zeros(case_size, dtype=bool)
+
+    numeric_names = [name for name, kind, _width in specs if kind != "str"]
+    numeric_offsets = [offsets[i] for i, spec in enumerate(specs) if spec[1] != "str"]
+    if numeric_names:
+        matrix = batch.select(numeric_names).to_numpy()
+        words[:, numeric_offsets] = np.ascontiguousarray(matrix, dtype="<f8").view("<u8")
+        numeric[numeric_offsets] = True
+
+    for (name, kind, width), offset in zip(specs, offsets):
+        if kind != "str":
+            continue
+        elements = sav_elements(kind, width)
+        values = batch.get_column(name).to_numpy().astype("U")
+        encoded = np.char.encode(values, "utf-8")
+        padded = np.char.ljust(encoded, elements * 8, b" ").astype(
+            "S{}".format(elements * 8)
+        )
+        words[:, offset : offset + elements] = padded.view("<u8").reshape(-1, elements)
+
+    return words, np.broadcast_to(numeric, words.shape)
+
+
+def sav_bytecode(words, numeric):
+    import numpy as np
+
+    words = words.reshape(-1)
+    numeric = numeric.reshape(-1)
+    if words.shape[0] == 0:
+        return b""
+    values = words.view("<f8")
+    codes = np.full(words.shape[0], 253, dtype=np.uint8)
+
+    with np.errstate(invalid="ignore"):
+        small_int = (
+            numeric
+            & (values >= 1 - SAV_BIAS)
+            & (values <= 251 - SAV_BIAS)
+            & (values == np.floor(values))
+        )
+    codes[small_int] = (values[small_int] + SAV_BIAS).astype(np.uint8)
+    codes[numeric & (values == SAV_SYSMIS)] = 255
+    codes[~numeric & (words == np.frombuffer(b" " * 8, dtype="<u8")[0])] = 254
+
+    block_codes = codes.reshape(-1, 8)
+    raw = block_codes == 253
+    block_words = 1 + raw.sum(axis=1)
+    block_start = np.concatenate([[0], np.cumsum(block_words)[:-1]])
+
+    out = np.zeros(int(block_words.sum()), dtype="<u8")
+    out[block_start] = block_codes.copy().view("<u8").reshape(-1)
+    rank = np.cumsum(raw, axis=1) - 1
+    raw_positions = (block_start[:, None] + 1 + rank)[raw]
+    out[raw_positions] = words.reshape(-1, 8)[raw]
+    return out.tobytes()
+
+
+def write_sav_stream(
+    source: Union[FrameLike, str],
+    output_path: str,
+    zsav: bool = False,
+    batch_bytes: int = DEFAULT_EXPORT_BATCH_BYTES,
+) -> int:
+    import numpy as np
+
+    frame = pl.scan_parquet(source) if isinstance(source, str) else source
+    nobs, specs = sav_column_specs(frame)
+    case_size = sum(sav_elements(kind, width) for _name, kind, width in specs)
+    batch_rows = max(1, batch_bytes // max(1, 8 * case_size))
+    compression = SAV_COMPRESSION_ZLIB if zsav else SAV_COMPRESSION_BYTECODE
+    rows = 0
+
+    prepared = frame.select(
+        [
+            pl.col(name).cast(pl.Utf8, strict=False).fill_null("")
+            if kind == "str"
+            else pl.col(name)
+            .cast(pl.Float64, strict=False)
+            .fill_nan(None)
+            .fill_null(SAV_SYSMIS)
+            for name, kind, _width in specs
+        ]
+    )
+
+    try:
+        with open(output_path, "wb") as handle:
+            handle.write(sav_dictionary(specs, nobs, compression))
+
+            zheader_ofs = handle.tell()
+            blocks: List[Tuple[int, int, int, int]] = []
+            pending = b""
+            carry_words = np.zeros(0, dtype="<u8")
+            carry_numeric = np.zeros(0, dtype=bool)
+
+            if zsav:
+                handle.write(b"\x00" * 24)
+
+            def emit(data: bytes, final: bool = False) -> None:
+                nonlocal pending
+                if not zsav:
+                    handle.write(data)
+                    return
+                pending += data
+                while len(pending) >= SAV_ZBLOCK_SIZE or (final and pending):
+                    chunk = pending[:SAV_ZBLOCK_SIZE]
+                    pending = pending[SAV_ZBLOCK_SIZE:]
+                    packed = zlib.compress(chunk)
+                    if blocks:
+                        u_ofs = blocks[-1][0] + blocks[-1][2]
+                        c_ofs = blocks[-1][1] + blocks[-1][3]
+                    else:
+                        u_ofs, c_ofs = zheader_ofs, zheader_ofs + 24
+                    blocks.append((u_ofs, c_ofs, len(chunk), len(packed)))
+                    handle.write(packed)
+
+            for batch in iter_frame_batches(prepared, batch_rows):
+                words, numeric = sav_batch_words(batch, specs)
+                words = np.concatenate([carry_words, words.reshape(-1)])
+                numeric = np.concatenate([carry_numeric, numeric.reshape(-1)])
+                usable = words.shape[0] - words.shape[0] % 8
+                emit(sav_bytecode(words[:usable], numeric[:usable]))
+                carry_words, carry_numeric = words[usable:], numeric[usable:]
+                rows += batch.height
+
+            if carry_words.shape[0]:
+                count = carry_words.shape[0]
+                sysmis = np.array([SAV_SYSMIS], dtype="<f8").view("<u8")
+                tail = bytearray(
+                    sav_bytecode(
+                        np.concatenate([carry_words, np.repeat(sysmis, 8 - count)]),
+                        np.concatenate([carry_numeric, np.ones(8 - count, dtype=bool)]),
+                    )
+                )
+                tail[count:8] = b"\x00" * (8 - count)
+                emit(bytes(tail))
+            emit(b"", final=True)
+
+            if zsav:
+                ztrailer_ofs = handle.tell()
+                handle.write(
+                    struct.pack(
+                        "<qqii", -int(SAV_BIAS), 0, SAV_ZBLOCK_SIZE, len(blocks)
+                    )
+                )
+                for u_ofs, c_ofs, u_size, c_size in blocks:
+                    handle.write(struct.pack("<qqii", u_ofs, c_ofs, u_size, c_size))
+                ztrailer_len = handle.tell() - ztrailer_ofs
+                handle.seek(zheader_ofs)
+                handle.write(
+                    struct.pack("<qqq", zheader_ofs, ztrailer_ofs, ztrailer_len)
+                )
+
+            if rows != nobs:
+                handle.seek(80)
+                handle.write(struct.pack("<i", rows))
+    except BaseException:
+        if os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except Exception:
+                pass
+        raise
+
+    return rows
+
+
+def rdata_header(
+    out,
+    sxp: str,
+    has_attr: bool = False,
+    has_tag: bool = False,
+    is_obj: bool = False,
+    levels: int = 0,
+) -> None:
+    flags = RDATA_SXP[sxp] | (levels << 12)
+    if is_obj:
+        flags |= 1 << 8
+    if has_attr:
+        flags |= 1 << 9
+    if has_tag:
+        flags |= 1 << 10
+    out.write(struct.pack(">i", flags))
+
+
+def rdata_char(value: Optional[str]) -> bytes:
+    if value is None:
+        return struct.pack(">ii", RDATA_SXP["char"], -1)
+    encoded = value.encode("utf-8")
+    flags = RDATA_SXP["char"] | ((64 if value.isascii() else 8) << 12)
+    return struct.pack(">ii", flags, len(encoded)) + encoded
+
+
+def rdata_symbol(out, name: str) -> None:
+    rdata_header(out, "sym")
+    out.write(rdata_char(name))
+
+
+def rdata_strings(out, values: Iterable[Optional[str]], length: int) -> None:
+    rdata_header(out, "str")
+    out.write(struct.pack(">i", length))
+    for value in values:
+        out.write(rdata_char(value))
+
+
+def rdata_attributes(out, attributes: List[Tuple[str, object]]) -> None:
+    for name, writer in attributes:
+        rdata_header(out, "list", has_tag=True)
+        rdata_symbol(out, name)
+        writer()
+    rdata_header(out, "nil")
+
+
+def rdata_column_kind(column: pl.Series) -> str:
+    dtype = column.dtype
+    if dtype == pl.Boolean:
+        return "lgl"
+    if dtype == pl.Categorical or isinstance(dtype, pl.Enum):
+        return "factor"
+    if dtype.is_float():
+        return "real"
+    if dtype.is_integer():
+        if column.len() == column.null_count():
+            return "int"
+        low, high = column.min(), column.max()
+        return "int" if RDATA_NA_INT < low and high <= 2147483647 else "real"
+    return "str"
+
+
+def rdata_column(out, column: pl.Series) -> None:
+    kind = rdata_column_kind(column)
+    length = column.len()
+
+    if kind == "str":
+        values = column.cast(pl.Utf8, strict=False)
+        rdata_strings(out, values.to_list(), length)
+        return
+
+    if kind == "factor":
+        if isinstance(column.dtype, pl.Enum):
+            levels = list(column.dtype.categories)
+        else:
+            levels = column.cast(pl.Utf8).drop_nulls().unique().sort().to_list()
+        codes = column.cast(pl.Utf8).cast(pl.Enum(levels)).to_physical()
+        column = (codes.cast(pl.Int32) + 1).fill_null(RDATA_NA_INT)
+        rdata_header(out, "int", has_attr=True, is_obj=True)
+    else:
+        rdata_header(out, kind)
+    out.write(struct.pack(">i", length))
+
+    for offset in range(0, length, RDATA_CHUNK_ROWS):
+        chunk = column.slice(offset, RDATA_CHUNK_ROWS)
+        if kind == "real":
+            nulls = chunk.is_null().to_numpy()
+            values = chunk.cast(pl.Float64).fill_null(0.0).to_numpy().astype(">f8")
+            bits = values.view(">u8")
+            bits[nulls] = RDATA_NA_REAL_BITS
+            out.write(bits.tobytes())
+        else:
+            values = chunk.cast(pl.Int32).fill_null(RDATA_NA_INT).to_numpy()
+            out.write(values.astype(">i4").tobytes())
+
+    if kind == "factor":
+        rdata_attributes(
+            out,
+            [
+                ("levels", lambda: rdata_strings(out, levels, len(levels))),
+                ("class", lambda: rdata_strings(out, ["factor"], 1)),
+            ],
+        )
+
+
+def write_rdata_native(
+    source: Union[FrameLike, str],
+    output_path: str,
+    object_name: str = "df",
+    compression: str = "gzip",
+) -> int:
+    frame = pl.scan_parquet(source) if isinstance(source, str) else source
+    columns = get_columns(frame)
+    names = normalise_time_column_name(columns)
+    if isinstance(frame, pl.DataFrame):
+        nrow = frame.height
+    else:
+        nrow = int(collect_frame(frame.select(pl.len())).item())
+
+    opener = lzma.open if compression == "xz" else gzip.open
+
+    try:
+        with opener(output_path, "wb") as raw, io.BufferedWriter(
+            raw, buffer_size=1024 * 1024
+        ) as out:
+            out.write(b"RDX2\nX\n")
+            out.write(
+                struct.pack(">iii", 2, RDATA_WRITER_VERSION, RDATA_MIN_READER_VERSION)
+            )
+
+            rdata_header(out, "list", has_tag=True)
+            rdata_symbol(out, object_name)
+            rdata_header(out, "vec", has_attr=True, is_obj=True)
+            out.write(struct.pack(">i", len(columns)))
+
+            for col in columns:
+                if isinstance(frame, pl.DataFrame):
+                    column = frame.get_column(col)
+                else:
+                    column = collect_frame(frame.select(col)).get_column(col)
+                rdata_column(out, column)
+                del column
+
+            def row_names() -> None:
+                rdata_header(out, "int")
+                if nrow:
+                    out.write(struct.pack(">iii", 2, RDATA_NA_INT, -nrow))
+                else:
+                    out.write(struct.pack(">i", 0))
+
+            rdata_attributes(
+                out,
+                [
+                    ("names", lambda: rdata_strings(out, names, len(names))),
+                    ("class", lambda: rdata_strings(out, ["data.frame"], 1)),
+                    ("row.names", row_names),
+                ],
+            )
+            rdata_header(out, "nil")
+    except BaseException:
+        if os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except Exception:
+                pass
+        raise
+
+    return nrow
+
+
+def export_multiplier(fmt: str) -> float:
+    if fmt == "parquet":
+        return 1.5
+    return 0.25
+
+
+def export_size_bytes(export_df: FrameLike) -> int:
+    # Lazy panels are scanned back from Parquet and written a batch at a time.
+    if isinstance(export_df, pl.LazyFrame):
+        return DEFAULT_EXPORT_BATCH_BYTES
+    return max(export_df.estimated_size(), 1)
+
+
+def write_output(
+    export_df: FrameLike,
+    output_path: str,
+    fmt: str,
+    stata_version: int,
+    zsav: bool = False,
+    rdata_compress: str = "gzip",
+    stata_compress: bool = True,
+    encode_entity: bool = False,
+) -> None:
+    with profile_stage("write", format=fmt) as stage:
+        profile_frame(stage, export_df)
+        if fmt == "dta":
+            write_dta_stream(
+                export_df,
+                output_path,
+                stata_version,
+                compress=stata_compress,
+                encode_entity=encode_entity,
+            )
+        elif fmt == "sav":
+            try:
+                write_sav_stream(export_df, output_path, zsav=zsav)
+            except ValueError as exc:
+                import pyreadstat
+
+                report("Info: {} Falling back to pyreadstat.".format(exc))
+                export_df = collect_frame(export_df)
+                try:
+                    pyreadstat.write_sav(export_df, output_path, compress=zsav)
+                except TypeError:
+                    pyreadstat.write_sav(
+                        export_df.to_pandas(), output_path, compress=zsav
+                    )
+        elif fmt == "rdata":
+            write_rdata_native(export_df, output_path, compression=rdata_compress)
+        elif fmt == "parquet" and isinstance(export_df, pl.LazyFrame):
+            export_df.sink_parquet(output_path, compression="zstd")
         elif fmt == "parquet":
             export_df.write_parquet(output_path, compression="zstd")
         else:
             raise ValueError("Unsupported output format: {}".format(fmt))
+        stage["output_bytes"] = os.path.getsize(output_path)
+
+
+def write(
+    export_df: FrameLike,
+    base: str,
+    fmt: str,
+    stata_version: int,
+    overwrite: bool = False,
+    min_free_ram_mb: int = DEFAULT_MIN_FREE_RAM_MB,
+    safe_mode: bool = False,
+    zsav: bool = False,
+    rdata_compress: str = "gzip",
+    stata_compress: bool = True,
+    encode_entity: bool = False,
+) -> bool:
+    output_path = "{}.{}".format(base, fmt)
+
+    if os.path.exists(output_path) and not overwrite:
+        report("Skipping {}: file already exists. Use --overwrite.".format(output_path))
+        return False
+
+    with memory_stage(
+        stage="export to {}".format(fmt),
+        input_size_bytes=export_size_bytes(export_df),
+        multiplier=export_multiplier(fmt),
+        minimum_free_mb=min_free_ram_mb,
+        safe_mode=safe_mode,
+    ):
+        try:
+            write_output(
+                export_df,
+                output_path,
+                fmt,
+                stata_version,
+                zsav=zsav,
+                rdata_compress=rdata_compress,
+                stata_compress=stata_compress,
+                encode_entity=encode_entity,
+            )
+            return True
+        except Exception as exc:
+            report("Error writing {}: {}".format(output_path, exc))
+    return False
+
+
+def write_all(
+    export_df: FrameLike,
+    base: str,
+    formats: List[str],
+    stata_version: int,
+    overwrite: bool = False,
+    min_free_ram_mb: int = DEFAULT_MIN_FREE_RAM_MB,
+    safe_mode: bool = False,
+    zsav: bool = False,
+    rdata_compress: str = "gzip",
+    stata_compress: bool = True,
+    encode_entity: bool = False,
+) -> List[str]:
+    if len(formats) < 2:
+        return [
+            fmt
+            for fmt in formats
+            if write(
+                export_df=export_df,
+                base=base,
+                fmt=fmt,
+                stata_version=stata_version,
+                overwrite=overwrite,
+                min_free_ram_mb=min_free_ram_mb,
+                safe_mode=safe_mode,
+                zsav=zsav,
+                rdata_compress=rdata_compress,
+                stata_compress=stata_compress,
+                encode_entity=encode_entity,
+            )
+        ]
+
+    targets: List[Tuple[str, str]] = []
+    for fmt in formats:
+        output_path = "{}.{}".format(base, fmt)
+        if os.path.exists(output_path) and not overwrite:
+            report("Skipping {}: file already exists. Use --overwrite.".format(output_path))
+            continue
+        targets.append((fmt, output_path))
+
+    if not targets:
+        return []
+
+    with memory_stage(
+        stage="export to {}".format(", ".join(fmt for fmt, _ in targets)),
+        input_size_bytes=export_size_bytes(export_df),
+        multiplier=sum(export_multiplier(fmt) for fmt, _ in targets),
+        minimum_free_mb=min_free_ram_mb,
+        safe_mode=safe_mode,
+    ):
+        written: List[str] = []
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = [
+                (
+                    fmt,
+                    output_path,
+                    executor.submit(
+                        write_output,
+                        export_df,
+                        output_path,
+                        fmt,
+                        stata_version,
+                        zsav,
+                        rdata_compress,
+                        stata_compress,
+                        encode_entity,
+                    ),
+                )
+                for fmt, output_path in targets
+            ]
+            for fmt, output_path, future in futures:
+                try:
+                    future.result()
+                    written.append(fmt)
+                except Exception as exc:
+                    report("Error writing {}: {}".format(output_path, exc))
+    return written
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(CACHE_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def conversion_options(path: str, args: argparse.Namespace) -> Dict[str, object]:
+    return {
+        "version": CACHE_VERSION,
+        "ext": os.path.splitext(path)[1].lower(),
+        "layout": args.layout,
+        "id": args.id,
+        "year_col": args.year_col,
+        "value_col": args.value_col,
+        "series_col": args.series_col,
+        "delimiter": args.delimiter,
+        "header_row": args.header_row,
+        "sheet": args.sheet,
+        "float32": args.float32,
+    }
+
+
+def conversion_cache_key(path: str, args: argparse.Namespace) -> str:
+    options = conversion_options(path, args)
+    options["content"] = file_digest(path)
+    encoded = json.dumps(options, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def cache_entry_name(fmt: str, args: argparse.Namespace) -> str:
+    if fmt == "dta":
+        return "stata{}{}{}.dta".format(
+            args.stata,
+            "" if args.no_compress else "-compress",
+            "-encode" if args.encode_country else "",
+        )
+    if fmt == "sav":
+        return "zsav.sav" if args.zsav else "sav.sav"
+    if fmt == "rdata":
+        return "{}.rdata".format(args.rdata_compress)
+    return "panel.parquet"
+
+
+def store_cache_file(entry_dir: str, name: str, source: Union[str, FrameLike]) -> None:
+    os.makedirs(entry_dir, exist_ok=True)
+    temp_path = os.path.join(entry_dir, ".{}.{}.tmp".format(name, os.getpid()))
+    try:
+        if isinstance(source, pl.LazyFrame):
+            source.sink_parquet(temp_path, compression="zstd")
+        elif isinstance(source, pl.DataFrame):
+            source.write_parquet(temp_path, compression="zstd")
+        else:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, os.path.join(entry_dir, name))
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def restore_cached_outputs(
+    entry_dir: str,
+    base: str,
+    formats: List[str],
+    args: argparse.Namespace,
+) -> List[str]:
+    missing = []
+    for fmt in formats:
+        output_path = "{}.{}".format(base, fmt)
+        if os.path.exists(output_path) and not args.overwrite:
+            report("Skipping {}: file already exists. Use --overwrite.".format(output_path))
+            continue
+        cached_path = os.path.join(entry_dir, cache_entry_name(fmt, args))
+        try:
+            shutil.copyfile(cached_path, output_path)
+            report("Info: Reused cached {}.".format(output_path))
+        except OSError:
+            missing.append(fmt)
+    return missing
+
+
+def evict_cache(cache_dir: str, limit_mb: int) -> None:
+    entries = []
+    total = 0
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+
+    for name in names:
+        if name.endswith(".tmp"):
+            continue
+        entry = os.path.join(cache_dir, name)
+        try:
+            if os.path.isdir(entry):
+                size = sum(
+                    os.path.getsize(os.path.join(entry, item))
+                    for item in os.listdir(entry)
+                )
+            else:
+                size = os.path.getsize(entry)
+            entries.append((os.path.getmtime(entry), size, entry))
+            total += size
+        except OSError:
+            continue
+
+    limit_bytes = limit_mb * 1024 * 1024
+    for _, size, entry in sorted(entries):
+        if total <= limit_bytes:
+            break
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            with contextlib.suppress(OSError):
+                os.remove(entry)
+        total -= size
+
+
+def update_manifest_path(base: str) -> str:
+    return "{}.dtabnk.json".format(base)
+
+
+def update_value_columns(
+    frame: FrameLike, layout: str, raw_columns_by_name: Dict[str, str]
+) -> List[str]:
+    if layout == "wide":
+        return [c for c in get_columns(frame) if is_year_like(c)]
+    return [
+        c
+        for c in get_columns(frame)
+        if parse_header_series_column(raw_columns_by_name.get(c, c))
+    ]
+
+
+def row_key_expr(key_cols: List[str]) -> pl.Expr:
+    return (
+        pl.struct([pl.col(c).cast(pl.Utf8) for c in key_cols])
+        .hash(seed=0)
+        .alias("__row__")
+    )
+
+
+def input_fingerprints(keyed: FrameLike, value_cols: List[str]) -> Dict[str, int]:
+    if not value_cols:
+        return {}
+    sums = keyed.select(
+        [
+            pl.struct([pl.col("__row__"), pl.col(c).cast(pl.Utf8)])
+            .hash(seed=0)
+            .sum()
+            .alias(c)
+            for c in value_cols
+        ]
+    )
+    return collect_frame(sums).row(0, named=True)
+
+
+def pack_row_keys(rows: pl.Series) -> str:
+    values = rows.to_list()
+    return base64.b64encode(struct.pack("<{}Q".format(len(values)), *values)).decode(
+        "ascii"
+    )
+
+
+def unpack_row_keys(packed: str) -> pl.Series:
+    raw = base64.b64decode(packed)
+    values = struct.unpack("<{}Q".format(len(raw) // 8), raw)
+    return pl.Series("__row__", values, dtype=pl.UInt64)
+
+
+def panel_keys(export_df: pl.DataFrame) -> List[str]:
+    id_col = "Country" if "Country" in export_df.columns else next(
+        c for c in export_df.columns if c != "Year"
+    )
+    return [id_col, "Year"]
+
+
+def load_update_manifest(base: str, path: str, args: argparse.Namespace) -> Optional[dict]:
+    if not os.path.exists("{}.parquet".format(base)):
+        return None
+    try:
+        with open(update_manifest_path(base), "r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("polars") != pl.__version__:
+        return None
+    if manifest.get("options") != conversion_options(path, args):
+        return None
+    return manifest
+
+
+def plan_update(
+    keyed: FrameLike,
+    rows: pl.Series,
+    manifest: dict,
+    key_cols: List[str],
+    value_cols: List[str],
+) -> Optional[List[FrameLike]]:
+    known_rows = unpack_row_keys(manifest["rows"])
+    known_cols = manifest["columns"]
+    old_cols = [c for c in value_cols if c in known_cols]
+    new_cols = [c for c in value_cols if c not in known_cols]
+
+    if len(old_cols) != len(known_cols):
+        report("Info: Columns were removed since the last run.")
+        return None
+
+    is_old = rows.is_in(known_rows.implode())
+    if int(is_old.sum()) != known_rows.len():
+        report("Info: Rows were removed since the last run.")
+        return None
+
+    fingerprints = input_fingerprints(
+        keyed.filter(pl.col("__row__").is_in(known_rows.implode())), old_cols
+    )
+    changed = [c for c in old_cols if fingerprints[c] != known_cols[c]]
+    if changed:
+        report("Info: Existing values changed in {}.".format(", ".join(changed[:5])))
+        return None
+
+    new_rows = rows.len() - known_rows.len()
+    deltas: List[FrameLike] = []
+    if new_cols:
+        deltas.append(keyed.select(key_cols + new_cols))
+    if new_rows and old_cols:
+        deltas.append(
+            keyed.filter(~pl.col("__row__").is_in(known_rows.implode())).select(
+                key_cols + old_cols
+            )
+        )
+    if deltas:
+        report(
+            "Info: Update adds {} new column(s) and {} new row(s).".format(
+                len(new_cols), new_rows
+            )
+        )
+    return deltas
+
+
+def merge_panel(panel: pl.DataFrame, delta: pl.DataFrame, keys: List[str]) -> pl.DataFrame:
+    columns = panel.columns + [c for c in delta.columns if c not in panel.columns]
+    merged = (
+        pl.concat([panel, delta], how="diagonal_relaxed")
+        .group_by(keys, maintain_order=True)
+        .agg(pl.all().drop_nulls().first())
+        .sort("Year", maintain_order=True, nulls_last=True)
+    )
+    return merged.select(columns)
+
+
+def update_file(
+    input_file: str,
+    base: str,
+    formats: List[str],
+    args: argparse.Namespace,
+    reshape_heavy: bool,
+    multi_export: bool,
+) -> None:
+    if "parquet" not in formats:
+        formats = formats + ["parquet"]
+    manifest = load_update_manifest(base, input_file, args)
+    file_size = source_size(input_file)
+
+    with profile_stage("source read", input_bytes=file_size) as stage:
+        frame, temp_parquet_path, policy = read_source(
+            path=input_file,
+            lazy_thresh_mb=args.lazy,
+            parquet_thresh_mb=args.parquet,
+            safe_mode=args.safe_mode,
+            delimiter=args.delimiter,
+            header_row_override=args.header_row,
+            reshape_heavy=reshape_heavy,
+            multi_export=True,
+            store_dir=None if args.no_cache else os.path.join(args.cache_dir, "sources"),
+            store_size_mb=args.intermediate_size,
+            sheet=args.sheet,
+        )
+        stage["policy"] = policy
+        profile_frame(stage, frame)
+
+    try:
+        frame, raw_columns_by_name = sanitise_source(frame)
+        chosen_layout = detect_layout(
+            frame,
+            args.layout,
+            args.year_col,
+            args.value_col,
+            raw_columns_by_name=raw_columns_by_name,
+        )
+        MEMORY_MODEL["layout"] = chosen_layout
+        report("Info: Using layout '{}'.".format(chosen_layout))
+
+        def reshape(part: FrameLike) -> pl.DataFrame:
+            df = reshape_frame(
+                frame=part,
+                chosen_layout=chosen_layout,
+                file_size=file_size,
+                id_var=args.id,
+                year_col=args.year_col,
+                value_col=args.value_col,
+                series_col=args.series_col,
+                min_free_ram_mb=args.min_free_ram,
+                safe_mode=args.safe_mode,
+                raw_columns_by_name=raw_columns_by_name,
+                spill_dir=os.path.dirname(os.path.abspath(input_file)),
+                float32=args.float32,
+            )
+            with profile_stage("prepare_export_df") as stage:
+                export_df = prepare_export_df(df)
+                profile_frame(stage, export_df)
+            return export_df
+
+        def export(export_df: pl.DataFrame, targets: List[str]) -> None:
+            if args.preview:
+                preview_output(export_df, rows=args.preview_rows)
+            write_all(
+                export_df=export_df,
+                base=base,
+                formats=targets,
+                stata_version=args.stata,
+                overwrite=True,
+                min_free_ram_mb=args.min_free_ram,
+                safe_mode=args.safe_mode,
+                zsav=args.zsav,
+                rdata_compress=args.rdata_compress,
+                stata_compress=not args.no_compress,
+                encode_entity=args.encode_country,
+            )
+
+        if chosen_layout not in UPDATE_LAYOUTS:
+            report(
+                "Info: --update tracks wide layouts only; converting {} in full.".format(
+                    input_file
+                )
+            )
+            export(reshape(frame), formats)
+            return
+
+        value_cols = update_value_columns(frame, chosen_layout, raw_columns_by_name)
+        key_cols = [c for c in get_columns(frame) if c not in value_cols]
+        keyed = frame.with_columns(row_key_expr(key_cols))
+        rows = collect_frame(keyed.select("__row__")).to_series()
+
+        deltas = None
+        if (
+            manifest
+            and manifest.get("layout") == chosen_layout
+            and manifest.get("key_columns") == key_cols
+        ):
+            deltas = plan_update(keyed, rows, manifest, key_cols, value_cols)
+
+        if deltas is None:
+            report("Info: Converting {} in full.".format(input_file))
+            export_df = reshape(keyed.drop("__row__"))
+            keys = panel_keys(export_df)
+            export(export_df, formats)
+        elif not deltas:
+            report("Info: No new data in {}.".format(input_file))
+            keys = manifest["keys"]
+            stale = [
+                fmt
+                for fmt in formats
+                if not os.path.exists("{}.{}".format(base, fmt))
+                or manifest["outputs"].get(fmt) != cache_entry_name(fmt, args)
+            ]
+            if stale or args.preview:
+                export(pl.read_parquet("{}.parquet".format(base)), stale)
+        else:
+            keys = manifest["keys"]
+            export_df = pl.read_parquet("{}.parquet".format(base))
+            for delta in deltas:
+                export_df = merge_panel(export_df, reshape(delta), keys)
+            export(export_df, formats)
+
+        outputs = dict(manifest["outputs"]) if manifest and deltas == [] else {}
+        outputs.update({fmt: cache_entry_name(fmt, args) for fmt in formats})
+        with open(update_manifest_path(base), "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    "polars": pl.__version__,
+                    "options": conversion_options(input_file, args),
+                    "layout": chosen_layout,
+                    "keys": keys,
+                    "key_columns": key_cols,
+                    "columns": input_fingerprints(keyed, value_cols),
+                    "rows": pack_row_keys(rows),
+                    "outputs": outputs,
+                },
+                handle,
+            )
+    finally:
+        remove_temp_file(temp_parquet_path)
+
+
+def convert_file(
+    input_file: str,
+    base: str,
+    formats: List[str],
+    args: argparse.Namespace,
+    reshape_heavy: bool,
+    multi_export: bool,
+) -> None:
+    if args.update:
+        update_file(input_file, base, formats, args, reshape_heavy, multi_export)
+        report("Done: {}".format(source_label(input_file, args)))
+        gc.collect()
+        return
+
+    entry_dir = None
+    missing = formats
+    export_df = None
+
+    if not args.no_cache:
+        entry_dir = os.path.join(
+            args.cache_dir, "outputs", conversion_cache_key(input_file, args)
+        )
+        missing = restore_cached_outputs(entry_dir, base, formats, args)
+        panel_path = os.path.join(entry_dir, "panel.parquet")
+        if (missing or args.preview) and os.path.exists(panel_path):
+            try:
+                export_df = pl.read_parquet(panel_path)
+                report("Info: Reused cached panel for {}.".format(input_file))
+            except Exception:
+                export_df = None
+
+    temp_paths: List[str] = []
+    try:
+        if export_df is None and (missing or args.preview):
+            sink_path = None
+            if "parquet" in missing and not args.preview:
+                sink_path = "{}.parquet".format(base)
+                if os.path.exists(sink_path) and not args.overwrite:
+                    sink_path = None
+            df = process_file(
+                path=input_file,
+                id_var=args.id,
+                layout=args.layout,
+                year_col=args.year_col,
+                value_col=args.value_col,
+                series_col=args.series_col,
+                lazy_thresh=args.lazy,
+                parquet_thresh=args.parquet,
+                min_free_ram_mb=args.min_free_ram,
+                safe_mode=args.safe_mode,
+                delimiter=args.delimiter,
+                header_row_override=args.header_row,
+                reshape_heavy=reshape_heavy,
+                multi_export=multi_export,
+                store_dir=(
+                    None if args.no_cache else os.path.join(args.cache_dir, "sources")
+                ),
+                store_size_mb=args.intermediate_size,
+                sheet=args.sheet,
+                float32=args.float32,
+                sink_path=sink_path,
+                temp_paths=temp_paths,
+            )
+            sunk = isinstance(df, pl.LazyFrame) and sink_path is not None
+            if sunk:
+                export_df = df
+                missing = [fmt for fmt in missing if fmt != "parquet"]
+            else:
+                with profile_stage("prepare_export_df") as stage:
+                    export_df = prepare_export_df(df)
+                    profile_frame(stage, export_df)
+            del df
+            if entry_dir:
+                try:
+                    store_cache_file(
+                        entry_dir,
+                        "panel.parquet",
+                        sink_path if sunk else export_df,
+                    )
+                except Exception as exc:
+                    report("Info: Could not update cache: {}".format(exc))
+
+        if args.preview:
+            preview_output(export_df, rows=args.preview_rows)
+
+        if missing:
+            written = write_all(
+                export_df=export_df,
+                base=base,
+                formats=missing,
+                stata_version=args.stata,
+                overwrite=args.overwrite,
+                min_free_ram_mb=args.min_free_ram,
+                safe_mode=args.safe_mode,
+                zsav=args.zsav,
+                rdata_compress=args.rdata_compress,
+                stata_compress=not args.no_compress,
+                encode_entity=args.encode_country,
+            )
+            if entry_dir:
+                try:
+                    for fmt in written:
+                        if fmt != "parquet":
+                            store_cache_file(
+                                entry_dir,
+                                cache_entry_name(fmt, args),
+                                "{}.{}".format(base, fmt),
+                            )
+                except Exception as exc:
+                    report("Info: Could not update cache: {}".format(exc))
+    finally:
+        for path in temp_paths:
+            remove_temp_file(path)
+
+    if entry_dir:
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        evict_cache(os.path.dirname(entry_dir), args.cache_size)
+
+    report("Done: {}".format(source_label(input_file, args)))
+    del export_df
+    gc.collect()
+
+
+def convert(
+    path: str,
+    layout: str = "auto",
+    id_var: str = "Country_Name",
+    year_col: Optional[str] = None,
+    value_col: Optional[str] = None,
+    series_col: Optional[str] = None,
+    sheet: Optional[str] = None,
+    delimiter: str = ",",
+    header_row: Optional[int] = None,
+    float32: bool = False,
+    lazy_thresh_mb: Optional[int] = None,
+    parquet_thresh_mb: Optional[int] = None,
+    min_free_ram_mb: int = DEFAULT_MIN_FREE_RAM_MB,
+    safe_mode: bool = False,
+    store_dir: Optional[str] = os.path.join(DEFAULT_CACHE_DIR, "sources"),
+    store_size_mb: int = DEFAULT_INTERMEDIATE_SIZE_MB,
+    on_message: Optional[Callable[[str], None]] = None,
+) -> pl.LazyFrame:
+    if layout not in LAYOUTS:
+        raise ValueError("Unsupported layout: {}".format(layout))
+    temp_paths: List[str] = []
+    with reporting(on_message):
+        try:
+            df = process_file(
+                path=path,
+                id_var=id_var,
+                layout=layout,
+                year_col=year_col,
+                value_col=value_col,
+                series_col=series_col,
+                lazy_thresh=lazy_thresh_mb,
+                parquet_thresh=parquet_thresh_mb,
+                min_free_ram_mb=min_free_ram_mb,
+                safe_mode=safe_mode,
+                delimiter=delimiter,
+                header_row_override=header_row,
+                store_dir=store_dir,
+                store_size_mb=store_size_mb,
+                sheet=sheet,
+                float32=float32,
+                temp_paths=temp_paths,
+                keep_lazy=True,
+            )
+            export_df = prepare_export_df(df)
+            # Temporary files are removed on return, so plans reading them are collected.
+            if temp_paths:
+                export_df = collect_frame(export_df)
+        finally:
+            for temp_path in temp_paths:
+                remove_temp_file(temp_path)
+    return export_df.lazy()
+
+
+def export(
+    frame: FrameLike,
+    base: str,
+    formats: Iterable[str] = ("dta",),
+    stata_version: int = 15,
+    overwrite: bool = False,
+    zsav: bool = False,
+    rdata_compress: str = "gzip",
+    stata_compress: bool = True,
+    encode_entity: bool = False,
+    min_free_ram_mb: int = DEFAULT_MIN_FREE_RAM_MB,
+    safe_mode: bool = False,
+    on_message: Optional[Callable[[str], None]] = None,
+) -> List[str]:
+    formats = list(formats)
+    unknown = [fmt for fmt in formats if fmt not in FORMAT_REQ]
+    if unknown:
+        raise ValueError("Unsupported output format: {}".format(", ".join(unknown)))
+    if stata_version not in STATA_RELEASES:
+        raise ValueError("stata_version must be between 11 and 15.")
+    if rdata_compress not in RDATA_COMPRESSION:
+        raise ValueError(
+            "rdata_compress must be one of: {}.".format(", ".join(RDATA_COMPRESSION))
+        )
+
+    with reporting(on_message):
+        written = write_all(
+            export_df=prepare_export_df(frame),
+            base=base,
+            formats=formats,
+            stata_version=stata_version,
+            overwrite=overwrite,
+            min_free_ram_mb=min_free_ram_mb,
+            safe_mode=safe_mode,
+            zsav=zsav,
+            rdata_compress=rdata_compress,
+            stata_compress=stata_compress,
+            encode_entity=encode_entity,
+        )
+    return ["{}.{}".format(base, fmt) for fmt in written]
+
+
+def source_label(input_file: str, args: argparse.Namespace) -> str:
+    if args.sheet is None:
+        return input_file
+    return "{} [{}]".format(input_file, args.sheet)
+
+
+def plan_conversions(
+    args: argparse.Namespace,
+    bases: List[str],
+    formats: List[str],
+    merge_dir: Optional[str] = None,
+) -> Tuple[List[ConversionJob], List[Tuple[str, str, List[Tuple[str, str]]]]]:
+    conversions: List[ConversionJob] = []
+    merges: List[Tuple[str, str, List[Tuple[str, str]]]] = []
+    targets: Dict[str, str] = {}
+
+    def claim(input_file: str, base: str) -> None:
+        key = os.path.normcase(os.path.abspath(base))
+        if key in targets:
+            raise ValueError(
+                "{} and {} would both write to {}.*; rename one or give each an --out.".format(
+                    targets[key], input_file, base
+                )
+            )
+        targets[key] = input_file
+
+    for i, (input_file, base) in enumerate(zip(args.files, bases)):
+        ext = os.path.splitext(input_file)[1].lower()
+        if not args.sheets or ext not in EXCEL_EXTENSIONS:
+            claim(input_file, base)
+            conversions.append((input_file, base, formats, args))
+            continue
+
+        sheets = resolve_sheets(input_file, args.sheets)
+        parts: List[Tuple[str, str]] = []
+        for sheet, name in zip(sheets, sanitise(sheets)):
+            sheet_args = argparse.Namespace(**vars(args))
+            sheet_args.sheet = sheet
+            if merge_dir:
+                sheet_base = os.path.join(merge_dir, "{}-{}".format(i, name))
+                conversions.append((input_file, sheet_base, ["parquet"], sheet_args))
+                parts.append((sheet, sheet_base))
+            else:
+                sheet_base = "{}_{}".format(base, name)
+                claim(input_file, sheet_base)
+                conversions.append((input_file, sheet_base, formats, sheet_args))
+        if merge_dir:
+            claim(input_file, base)
+            merges.append((input_file, base, parts))
+
+    return conversions, merges
+
+
+def merge_sheet_outputs(
+    input_file: str,
+    base: str,
+    parts: List[Tuple[str, str]],
+    formats: List[str],
+    args: argparse.Namespace,
+) -> bool:
+    panel = None
+    keys: List[str] = []
+    with profile_stage("sheet merge", sheets=len(parts)) as stage:
+        for sheet, sheet_base in parts:
+            sheet_path = "{}.parquet".format(sheet_base)
+            if not os.path.exists(sheet_path):
+                report("Info: Sheet '{}' produced no panel; leaving it out.".format(sheet))
+                continue
+            frame = pl.read_parquet(sheet_path)
+            if panel is None:
+                panel, keys = frame, panel_keys(frame)
+            elif all(key in frame.columns for key in keys):
+                panel = merge_panel(panel, frame, keys)
+            else:
+                report(
+                    "Info: Sheet '{}' has no {} columns; leaving it out.".format(
+                        sheet, "/".join(keys)
+                    )
+                )
+        if panel is not None:
+            profile_frame(stage, panel)
+
+    if panel is None:
+        report("Error processing {}: no sheet produced a panel.".format(input_file))
+        return False
+
+    if args.preview:
+        preview_output(panel, rows=args.preview_rows)
+    write_all(
+        export_df=panel,
+        base=base,
+        formats=formats,
+        stata_version=args.stata,
+        overwrite=args.overwrite,
+        min_free_ram_mb=args.min_free_ram,
+        safe_mode=args.safe_mode,
+        zsav=args.zsav,
+        rdata_compress=args.rdata_compress,
+        stata_compress=not args.no_compress,
+        encode_entity=args.encode_country,
+    )
+    report("Done: {} ({} sheets merged)".format(input_file, len(parts)))
+    return True
+
+
+def expand_batch(pattern: str) -> List[str]:
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(
+        path
+        for path in paths
+        if os.path.isfile(path)
+        and os.path.splitext(path)[1].lower() in INPUT_EXTENSIONS
+        and "metadata" not in os.path.basename(path).lower()
+    )
+
+
+def batch_manifest_path(pattern: str) -> str:
+    if os.path.isdir(pattern):
+        root = pattern
+    else:
+        root = os.path.dirname(re.split(r"[*?\[]", pattern, maxsplit=1)[0])
+    return os.path.join(root or ".", BATCH_MANIFEST_FILE)
+
+
+def load_batch_manifest(path: str) -> Dict[str, object]:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except FileNotFoundError:
+        return {"files": {}}
+    except (OSError, ValueError) as exc:
+        report("Info: Ignoring unreadable batch manifest {}: {}".format(path, exc))
+        return {"files": {}}
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_batch_manifest(path: str, manifest: Dict[str, object]) -> None:
+    manifest["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(manifest, handle, indent=2)
+        os.replace(temp_path, path)
+    except OSError as exc:
+        report("Info: Could not save batch manifest: {}".format(exc))
+        remove_temp_file(temp_path)
+
+
+def batch_key(job: ConversionJob) -> str:
+    input_file, _base, _formats, job_args = job
+    return source_label(os.path.abspath(input_file), job_args)
+
+
+def job_outputs(job: ConversionJob) -> Dict[str, str]:
+    _input_file, base, formats, job_args = job
+    return {
+        os.path.abspath("{}.{}".format(base, fmt)): cache_entry_name(fmt, job_args)
+        for fmt in formats
+    }
+
+
+def batch_job_finished(entry: Optional[Dict[str, object]], job: ConversionJob) -> bool:
+    if not entry or entry.get("status") != "done":
+        return False
+    outputs = job_outputs(job)
+    if (
+        entry.get("options") != conversion_options(job[0], job[3])
+        or entry.get("outputs") != outputs
+        or not all(os.path.exists(path) for path in outputs)
+    ):
+        return False
+    try:
+        stat = os.stat(job[0])
+    except OSError:
+        return False
+    if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    return entry.get("input_hash") == file_digest(job[0])
+
+
+def record_batch_outcome(
+    manifest: Dict[str, object],
+    path: str,
+    job: ConversionJob,
+    outcome: Dict[str, object],
+) -> Dict[str, object]:
+    entry = manifest["files"].setdefault(batch_key(job), {})
+    for key in ("error", "error_type", "peak_rss_delta_mb", "seconds"):
+        entry.pop(key, None)
+
+    if outcome["status"] == "done":
+        missing = [path for path in job_outputs(job) if not os.path.exists(path)]
+        if missing:
+            outcome = dict(
+                outcome,
+                status="failed",
+                error_type="MissingOutput",
+                error="no output written to {}".format(", ".join(missing)),
+            )
+    entry.update(outcome)
+
+    if outcome["status"] == "running":
+        entry["attempts"] = int(entry.get("attempts", 0)) + 1
+        entry["started"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    elif outcome["status"] == "done":
+        stat = os.stat(job[0])
+        entry.update(
+            options=conversion_options(job[0], job[3]),
+            outputs=job_outputs(job),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            input_hash=file_digest(job[0]),
+        )
+    save_batch_manifest(path, manifest)
+    return outcome
+
+
+def run_conversion(
+    input_file: str,
+    base: str,
+    formats: List[str],
+    args: argparse.Namespace,
+    reshape_heavy: bool,
+    multi_export: bool,
+) -> Dict[str, object]:
+    label = source_label(input_file, args)
+    PROFILE_STATE["file"] = label
+    if not args.no_calibrate:
+        load_memory_model(os.path.join(args.cache_dir, MEMORY_MODEL_FILE))
+    MEMORY_MODEL["layout"] = None if args.layout == "auto" else args.layout
+    started = time.perf_counter()
+    try:
+        with profile_stage("conversion"), track_peak_rss() as usage:
+            convert_file(input_file, base, formats, args, reshape_heavy, multi_export)
+        record_memory_observation("conversion", source_size(input_file), usage["delta"])
+        outcome: Dict[str, object] = {
+            "status": "done",
+            "peak_rss_delta_mb": round(usage["delta"] / 1024 / 1024, 1),
+        }
+    except MemoryError as exc:
+        report("Memory safety stop for {}: {}".format(label, exc))
+        outcome = {"status": "failed", "error_type": "MemoryError", "error": str(exc)}
     except Exception as exc:
-        print("Error writing {}: {}".format(output_path, exc))
+        report("Error processing {}: {}".format(label, exc))
+        outcome = {"status": "failed", "error_type": type(exc).__name__, "error": str(exc)}
+    finally:
+        save_memory_model()
+    outcome["seconds"] = round(time.perf_counter() - started, 3)
+    return outcome
+
+
+def run_conversion_job(
+    input_file: str,
+    base: str,
+    formats: List[str],
+    args: argparse.Namespace,
+    reshape_heavy: bool,
+    multi_export: bool,
+) -> Tuple[str, List[Dict[str, object]], Dict[str, object]]:
+    configure_polars()
+    reset_job_state(args)
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        outcome = run_conversion(
+            input_file, base, formats, args, reshape_heavy, multi_export
+        )
+    return buffer.getvalue(), list(PROFILE_STATE["records"] or []), outcome
+
+
+def estimate_job_memory_mb(
+    path: str,
+    args: argparse.Namespace,
+    reshape_heavy: bool,
+    multi_export: bool,
+) -> int:
+    try:
+        file_size = source_size(path)
+    except OSError:
+        return WORKER_BASE_RAM_MB
+
+    policy = derive_memory_policy(
+        file_size_bytes=file_size,
+        lazy_thresh_mb=args.lazy,
+        parquet_thresh_mb=args.parquet,
+        safe_mode=args.safe_mode,
+        reshape_heavy=reshape_heavy,
+        multi_export=multi_export,
+    )
+    if policy["use_parquet"]:
+        multiplier = 2.0
+    elif policy["use_lazy"]:
+        multiplier = 2.5
+    else:
+        multiplier = 3.0
+    if multi_export:
+        multiplier += 0.5
+    MEMORY_MODEL["layout"] = None if args.layout == "auto" else args.layout
+    multiplier = predict_multiplier("conversion", file_size, multiplier, args.safe_mode)
+
+    return WORKER_BASE_RAM_MB + int(math.ceil(int(policy["file_mb"]) * multiplier))
+
+
+def run_parallel(
+    args: argparse.Namespace,
+    conversions: List[ConversionJob],
+    reshape_heavy: bool,
+    on_start: Optional[Callable[[int], None]] = None,
+    on_result: Optional[Callable[[int, Dict[str, object]], None]] = None,
+) -> None:
+    jobs = min(args.jobs, len(conversions))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // jobs)
+    needs = [
+        estimate_job_memory_mb(path, job_args, reshape_heavy, len(job_formats) > 1)
+        for path, _, job_formats, job_args in conversions
+    ]
+    labels = [source_label(path, job_args) for path, _, _, job_args in conversions]
+    budget_mb = get_available_ram_mb() - max(
+        args.min_free_ram, 1024 if args.safe_mode else args.min_free_ram
+    )
+
+    report(
+        "Running up to {} jobs | Polars threads per job: {} | RAM budget: {} MB".format(
+            jobs, threads_per_worker, max(0, budget_mb)
+        )
+    )
+
+    pending = list(range(len(conversions)))
+    running: Dict[Future, int] = {}
+    logs: Dict[int, str] = {}
+    next_report = 0
+
+    saved_threads = os.environ.get("POLARS_MAX_THREADS")
+    os.environ["POLARS_MAX_THREADS"] = str(threads_per_worker)
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=jobs, mp_context=context)
+
+    try:
+        while pending or running:
+            committed_mb = sum(needs[i] for i in running.values())
+            for i in list(pending):
+                if len(running) >= jobs:
+                    break
+                if running and committed_mb + needs[i] > budget_mb:
+                    continue
+                input_file, base, job_formats, job_args = conversions[i]
+                future = executor.submit(
+                    run_conversion_job,
+                    input_file,
+                    base,
+                    job_formats,
+                    job_args,
+                    reshape_heavy,
+                    len(job_formats) > 1,
+                )
+                running[future] = i
+                committed_mb += needs[i]
+                pending.remove(i)
+                if on_start:
+                    on_start(i)
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                i = running.pop(future)
+                try:
+                    logs[i], records, outcome = future.result()
+                    if PROFILE_STATE["records"] is not None:
+                        PROFILE_STATE["records"].extend(records)
+                except BrokenProcessPool:
+                    broken = True
+                    logs[i] = "Error processing {}: worker process terminated abruptly.\n".format(
+                        labels[i]
+                    )
+                    outcome = {
+                        "status": "failed",
+                        "error_type": "BrokenProcessPool",
+                        "error": "worker process terminated abruptly",
+                    }
+                except Exception as exc:
+                    logs[i] = "Error processing {}: {}\n".format(labels[i], exc)
+                    outcome = {
+                        "status": "failed",
+                        "error_type": type(exc).__name__,
+                        "error": str(exc),
+                    }
+                if on_result:
+                    on_result(i, outcome)
+
+            if broken:
+                for future, i in running.items():
+                    future.cancel()
+                    pending.append(i)
+                running.clear()
+                pending.sort()
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=jobs, mp_context=context)
+
+            while next_report in logs:
+                sys.stdout.write(logs.pop(next_report))
+                sys.stdout.flush()
+                next_report += 1
+    finally:
+        executor.shutdown(wait=True)
+        if saved_threads is None:
+            os.environ.pop("POLARS_MAX_THREADS", None)
+        else:
+            os.environ["POLARS_MAX_THREADS"] = saved_threads
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description=(
             "dtabnk: convert World Bank Open Data CSV/Excel files to panel datasets "
             "in STATA (default), SPSS, R, and/or Parquet formats."
         )
     )
-    parser.add_argument("files", nargs="*", help="Input files (.csv, .xlsx, .xls).")
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Input files (.csv, .xlsx, .xls, or CSV compressed as .zip, .gz, .zst, .xz).",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="DIR|GLOB",
+        default=None,
+        help="Convert every input file in a directory or matching a glob, tracking progress in a resumable manifest.",
+    )
+    parser.add_argument(
+        "--batch-manifest",
+        metavar="PATH",
+        default=None,
+        help="Batch manifest file (default: {} in the batch directory).".format(
+            BATCH_MANIFEST_FILE
+        ),
+    )
     parser.add_argument(
         "--sav", action="store_true", help="Output SPSS/PSPP .sav file."
     )
+    parser.add_argument(
+        "--zsav",
+        action="store_true",
+        help="Compress SPSS output with zlib (ZSAV) instead of row compression.",
+    )
     parser.add_argument("--rdata", action="store_true", help="Output R .RData file.")
+    parser.add_argument(
+        "--rdata-compress",
+        choices=RDATA_COMPRESSION,
+        default="gzip",
+        help="Compression for R .RData output: gzip or xz (default: gzip).",
+    )
     parser.add_argument(
         "--parquet-out", action="store_true", help="Output Parquet .parquet file."
     )
@@ -1248,6 +4561,17 @@ def parse_args() -> argparse.Namespace:
         nargs="*",
         help="Specify output filename(s) (default: input filename). Must match the number of input files.",
     )
+    parser.add_argument(
+        "--sheets",
+        nargs="+",
+        metavar="SHEET",
+        help="Excel sheets to convert, by name, 1-based index or 'all'; each sheet becomes its own panel written to <output>_<sheet>.",
+    )
+    parser.add_argument(
+        "--merge-sheets",
+        action="store_true",
+        help="With --sheets, merge the sheet panels on entity and year into a single output.",
+    )
     parser.add_argument(
         "--id",
         default="Country_Name",
@@ -1255,7 +4579,7 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--layout",
-        choices=["auto", "wide", "wide_header_series", "long", "year_rows"],
+        choices=LAYOUTS,
         default="auto",
         help="Specify input layout: auto, wide, wide_header_series, long, or year_rows (default: auto).",
     )
@@ -1280,6 +4604,16 @@ def parse_args() -> argparse.Namespace:
         default=15,
         help="Specify STATA .dta version (11-15; default: 15).",
     )
+    parser.add_argument(
+        "--no-compress",
+        action="store_true",
+        help="Keep the panel's storage types in .dta output instead of the smallest lossless type per column.",
+    )
+    parser.add_argument(
+        "--encode-country",
+        action="store_true",
+        help="Store the entity column in .dta output as a value-labelled integer, like Stata's encode.",
+    )
     parser.add_argument(
         "--lazy",
         type=int,
@@ -1303,6 +4637,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Use more conservative memory behaviour and stop before risky reshape/export steps.",
     )
+    parser.add_argument(
+        "--float32",
+        action="store_true",
+        help="Store values as 32-bit floats (about 7 significant digits) to halve panel memory and output size.",
+    )
     parser.add_argument(
         "--preview",
         action="store_true",
@@ -1327,11 +4666,83 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Override detected CSV header row (0-based).",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="Number of input files to convert in parallel worker processes (default: {}).".format(
+            DEFAULT_JOBS
+        ),
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Merge only new year/series columns and new rows into the existing outputs, tracked by a <output>.dtabnk.json manifest (implies Parquet output).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always reconvert inputs instead of reusing cached outputs and Parquet intermediates.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for cached conversion outputs (default: {}).".format(
+            DEFAULT_CACHE_DIR
+        ),
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE_MB,
+        help="Maximum cache size (MB); least recently used entries are evicted (default: {}).".format(
+            DEFAULT_CACHE_SIZE_MB
+        ),
+    )
+    parser.add_argument(
+        "--intermediate-size",
+        type=int,
+        default=DEFAULT_INTERMEDIATE_SIZE_MB,
+        help="Maximum size (MB) of stored Parquet intermediates; least recently used files are evicted (default: {}).".format(
+            DEFAULT_INTERMEDIATE_SIZE_MB
+        ),
+    )
+    parser.add_argument(
+        "--no-calibrate",
+        action="store_true",
+        help="Use the fixed memory multipliers instead of ones learned from earlier runs (stored as {} in the cache directory).".format(
+            MEMORY_MODEL_FILE
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        default=None,
+        help="Write per-stage wall time, CPU time, peak RSS and row/column counts to a JSON file.",
+    )
     parser.add_argument(
         "--overwrite",
         action="store_true",
         help="Overwrite existing output files without prompting.",
     )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as a daemon on a Unix socket, converting jobs sent with --connect in --jobs warm worker processes.",
+    )
+    parser.add_argument(
+        "--connect",
+        action="store_true",
+        help="Send this command line to a running --serve daemon instead of converting here.",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        default=DEFAULT_SOCKET_PATH,
+        help="Unix socket for --serve and --connect (default: {}).".format(
+            DEFAULT_SOCKET_PATH
+        ),
+    )
     parser.add_argument(
         "--license",
         "--licence",
@@ -1339,16 +4750,25 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Print software licence information and exit.",
     )
-    return parser.parse_args()
+    parser.set_defaults(sheet=None)
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    args = parse_args()
-
+def run_cli(args: argparse.Namespace) -> List[Dict[str, object]]:
     if args.license:
         print(LICENSE_TEXT)
         raise SystemExit(0)
 
+    if args.batch:
+        if args.out:
+            raise SystemExit("Error: --out cannot be combined with --batch.")
+        if args.merge_sheets:
+            raise SystemExit("Error: --merge-sheets cannot be combined with --batch.")
+        matched = expand_batch(args.batch)
+        if not matched:
+            raise SystemExit("Error: --batch matched no input files: {}".format(args.batch))
+        args.files = args.files + [f for f in matched if f not in args.files]
+
     if not args.files:
         raise SystemExit(
             "Error: no input files provided. Use -h to view help."
@@ -1368,6 +4788,15 @@ def main() -> None:
     if args.preview_rows < 1:
         raise SystemExit("Error: --preview-rows must be at least 1.")
 
+    if args.jobs < 1:
+        raise SystemExit("Error: --jobs must be at least 1.")
+
+    if args.cache_size < 0:
+        raise SystemExit("Error: --cache-size must not be negative.")
+
+    if args.intermediate_size < 0:
+        raise SystemExit("Error: --intermediate-size must not be negative.")
+
     formats = ["dta"]
     if args.all:
         formats = ["dta", "sav", "rdata", "parquet"]
@@ -1379,7 +4808,14 @@ def main() -> None:
         if args.parquet_out:
             formats.append("parquet")
 
-    multi_export = len(formats) > 1
+    if args.merge_sheets and not args.sheets:
+        raise SystemExit("Error: --merge-sheets requires --sheets.")
+
+    if args.merge_sheets and args.update:
+        raise SystemExit("Error: --merge-sheets cannot be combined with --update.")
+
+    ensure_dependencies(required_packages(formats, args.files))
+
     reshape_heavy = args.layout in {
         "wide",
         "wide_header_series",
@@ -1387,51 +4823,288 @@ def main() -> None:
         "year_rows",
     } or args.layout == "auto"
 
-    for i, input_file in enumerate(args.files):
-        try:
-            df = process_file(
-                path=input_file,
-                id_var=args.id,
-                layout=args.layout,
-                year_col=args.year_col,
-                value_col=args.value_col,
-                series_col=args.series_col,
-                lazy_thresh=args.lazy,
-                parquet_thresh=args.parquet,
-                min_free_ram_mb=args.min_free_ram,
-                safe_mode=args.safe_mode,
-                delimiter=args.delimiter,
-                header_row_override=args.header_row,
-                reshape_heavy=reshape_heavy,
-                multi_export=multi_export,
+    bases = [
+        args.out[i] if args.out else output_base(input_file)
+        for i, input_file in enumerate(args.files)
+    ]
+
+    merge_dir = tempfile.mkdtemp(prefix="dtabnk-sheets-") if args.merge_sheets else None
+    try:
+        conversions, merges = plan_conversions(args, bases, formats, merge_dir)
+    except (ValueError, OSError) as exc:
+        if merge_dir:
+            shutil.rmtree(merge_dir, ignore_errors=True)
+        raise SystemExit("Error: {}".format(exc))
+
+    manifest_path = None
+    manifest: Dict[str, object] = {}
+    finished = 0
+    if args.batch:
+        manifest_path = args.batch_manifest or batch_manifest_path(args.batch)
+        manifest = load_batch_manifest(manifest_path)
+        remaining = [
+            job
+            for job in conversions
+            if not batch_job_finished(manifest["files"].get(batch_key(job)), job)
+        ]
+        finished = len(conversions) - len(remaining)
+        conversions = remaining
+        report(
+            "Batch: {} to convert, {} already finished (manifest: {}).".format(
+                len(conversions), finished, manifest_path
+            )
+        )
+
+    def on_start(i: int) -> None:
+        if manifest_path:
+            record_batch_outcome(
+                manifest, manifest_path, conversions[i], {"status": "running"}
             )
 
-            if args.preview:
-                preview_output(df, rows=args.preview_rows)
+    outcomes: List[Dict[str, object]] = []
 
-            export_df = prepare_export_df(df)
-            base = args.out[i] if args.out else os.path.splitext(input_file)[0]
-            for fmt in formats:
-                write(
-                    export_df=export_df,
-                    base=base,
-                    fmt=fmt,
-                    stata_version=args.stata,
-                    overwrite=args.overwrite,
-                    min_free_ram_mb=args.min_free_ram,
-                    safe_mode=args.safe_mode,
+    def on_result(i: int, outcome: Dict[str, object]) -> None:
+        if manifest_path:
+            outcome = record_batch_outcome(
+                manifest, manifest_path, conversions[i], outcome
+            )
+        outcomes.append(
+            dict(
+                outcome,
+                file=source_label(conversions[i][0], conversions[i][3]),
+                outputs=[p for p in job_outputs(conversions[i]) if os.path.exists(p)],
+            )
+        )
+
+    reset_job_state(args)
+
+    try:
+        if args.jobs > 1 and len(conversions) > 1:
+            if not args.no_calibrate:
+                load_memory_model(os.path.join(args.cache_dir, MEMORY_MODEL_FILE))
+            run_parallel(args, conversions, reshape_heavy, on_start, on_result)
+        else:
+            for i, (input_file, base, job_formats, job_args) in enumerate(conversions):
+                on_start(i)
+                on_result(
+                    i,
+                    run_conversion(
+                        input_file,
+                        base,
+                        job_formats,
+                        job_args,
+                        reshape_heavy,
+                        len(job_formats) > 1,
+                    ),
                 )
 
-            print("Done: {}".format(input_file))
-            del export_df
-            del df
-            gc.collect()
-        except MemoryError as exc:
-            print("Memory safety stop for {}: {}".format(input_file, exc))
-            continue
-        except Exception as exc:
-            print("Error processing {}: {}".format(input_file, exc))
-            continue
+        for input_file, base, parts in merges:
+            merge_sheet_outputs(input_file, base, parts, formats, args)
+    finally:
+        if merge_dir:
+            shutil.rmtree(merge_dir, ignore_errors=True)
+
+    if args.profile:
+        write_profile(args.profile, args)
+
+    if manifest_path:
+        failed = sum(1 for outcome in outcomes if outcome["status"] != "done")
+        report(
+            "Batch summary: {} converted, {} failed, {} already finished ({:.1f}s converting).".format(
+                len(outcomes) - failed,
+                failed,
+                finished,
+                sum(float(outcome.get("seconds", 0.0)) for outcome in outcomes),
+            )
+        )
+        if failed:
+            report(
+                "Failed files are listed in {} and are retried on the next run.".format(
+                    manifest_path
+                )
+            )
+
+    return outcomes
+
+
+def cli_exit_status(args: argparse.Namespace, outcomes: List[Dict[str, object]]) -> int:
+    if args.batch and any(outcome["status"] != "done" for outcome in outcomes):
+        return 1
+    return 0
+
+
+def warm_worker() -> None:
+    configure_polars()
+    ensure_dependencies(SERVE_PRELOAD)
+    for name in SERVE_PRELOAD:
+        with contextlib.suppress(ImportError):
+            importlib.import_module(name)
+
+
+def serve_job(argv: List[str], cwd: str) -> Dict[str, object]:
+    buffer = io.StringIO()
+    response: Dict[str, object] = {"exit": 0, "results": []}
+    try:
+        with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+            os.chdir(cwd)
+            args = parse_args(argv)
+            args.serve = args.connect = False
+            args.jobs = 1
+            outcomes = run_cli(args)
+            response["results"] = outcomes
+            response["exit"] = cli_exit_status(args, outcomes)
+    except SystemExit as exc:
+        if isinstance(exc.code, str):
+            buffer.write(exc.code + "\n")
+            response["exit"] = 1
+        else:
+            response["exit"] = exc.code or 0
+    except Exception as exc:
+        buffer.write("Error: {}\n".format(exc))
+        response["exit"] = 1
+    response["log"] = buffer.getvalue()
+    return response
+
+
+def start_serve_pool(jobs: int) -> ProcessPoolExecutor:
+    context = multiprocessing.get_context("spawn")
+    try:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=context,
+            initializer=warm_worker,
+            max_tasks_per_child=SERVE_TASKS_PER_WORKER,
+        )
+    except TypeError:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, mp_context=context, initializer=warm_worker
+        )
+    wait([executor.submit(gc.collect) for _ in range(jobs)])
+    return executor
+
+
+def handle_client(
+    conn: socket.socket, pool: Dict[str, object], lock: threading.Lock, jobs: int
+) -> None:
+    with conn:
+        with conn.makefile("rb") as stream:
+            line = stream.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode("utf-8"))
+            argv = [str(arg) for arg in request["argv"]]
+            with lock:
+                try:
+                    future = pool["executor"].submit(serve_job, argv, str(request["cwd"]))
+                except BrokenProcessPool:
+                    pool["executor"] = start_serve_pool(jobs)
+                    future = pool["executor"].submit(serve_job, argv, str(request["cwd"]))
+                executor = pool["executor"]
+            try:
+                response = future.result()
+            except BrokenProcessPool:
+                with lock:
+                    if pool["executor"] is executor:
+                        pool["executor"] = start_serve_pool(jobs)
+                response = {
+                    "exit": 1,
+                    "results": [],
+                    "log": "Error: worker process terminated abruptly.\n",
+                }
+        except (ValueError, KeyError, TypeError) as exc:
+            response = {"exit": 2, "results": [], "log": "Error: bad request: {}\n".format(exc)}
+        with contextlib.suppress(OSError):
+            conn.sendall((json.dumps(response) + "\n").encode("utf-8"))
+
+
+def serve(socket_path: str, jobs: int) -> None:
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)
+            else:
+                raise SystemExit(
+                    "Error: a dtabnk daemon is already listening on {}.".format(socket_path)
+                )
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+
+    os.environ["POLARS_MAX_THREADS"] = str(max(1, (os.cpu_count() or 1) // jobs))
+    pool: Dict[str, object] = {"executor": start_serve_pool(jobs)}
+    lock = threading.Lock()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        # The socket is created owner-only, so no one else can connect before chmod.
+        umask = os.umask(0o077)
+        try:
+            server.bind(socket_path)
+        finally:
+            os.umask(umask)
+        os.chmod(socket_path, 0o600)
+        server.listen()
+        report("Serving on {} with {} warm workers.".format(socket_path, jobs))
+        sys.stdout.flush()
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(
+                target=handle_client, args=(conn, pool, lock, jobs), daemon=True
+            ).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        with contextlib.suppress(OSError):
+            os.remove(socket_path)
+        pool["executor"].shutdown(wait=False, cancel_futures=True)
+        report("Daemon on {} stopped.".format(socket_path))
+
+
+def forward_to_daemon(socket_path: str, argv: List[str]) -> int:
+    request = {"argv": argv, "cwd": os.getcwd()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError as exc:
+            raise SystemExit(
+                "Error: no dtabnk daemon on {} ({}). Start one with --serve.".format(
+                    socket_path, exc
+                )
+            )
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with client.makefile("rb") as stream:
+            line = stream.readline()
+    if not line:
+        raise SystemExit("Error: the dtabnk daemon closed the connection without a reply.")
+    response = json.loads(line.decode("utf-8"))
+    sys.stdout.write(response["log"])
+    sys.stdout.flush()
+    return int(response["exit"])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    configure_polars()
+
+    if (args.serve or args.connect) and not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("Error: --serve and --connect need Unix domain sockets.")
+
+    if args.serve:
+        if args.jobs < 1:
+            raise SystemExit("Error: --jobs must be at least 1.")
+        serve(args.socket, args.jobs)
+        return
+
+    if args.connect:
+        raise SystemExit(
+            forward_to_daemon(args.socket, sys.argv[1:] if argv is None else argv)
+        )
+
+    status = cli_exit_status(args, run_cli(args))
+    if status:
+        raise SystemExit(status)
 
 
 if __name__ == "__main__":
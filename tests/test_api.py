@@ -0,0 +1,39 @@
+import polars as pl
+from polars.testing import assert_frame_equal
+
+import dtabnk
+
+CSV = (
+    '"Country Name","Country Code","2000 [YR2000]","2001 [YR2001]"\n'
+    '"Aruba","ABW",1.5,..\n'
+    '"Chad","TCD",2.5,3.5\n'
+)
+
+
+def write_input(tmp_path):
+    path = tmp_path / "in" / "gdp.csv"
+    path.parent.mkdir()
+    path.write_text(CSV)
+    return path
+
+
+def test_convert_stays_lazy_over_the_stored_intermediate(tmp_path):
+    path = write_input(tmp_path)
+    expected = dtabnk.convert(str(path), store_dir=None).collect()
+
+    panel = dtabnk.convert(str(path), lazy_thresh_mb=0, store_dir=str(tmp_path / "store"))
+
+    assert "PARQUET" in panel.explain().upper()
+    assert_frame_equal(panel.collect(), expected)
+    written = dtabnk.export(panel, str(tmp_path / "out"), formats=["parquet"])
+    assert_frame_equal(pl.read_parquet(written[0]), expected)
+
+
+def test_convert_without_a_store_leaves_no_temporary_files(tmp_path):
+    path = write_input(tmp_path)
+    expected = dtabnk.convert(str(path), store_dir=None).collect()
+
+    panel = dtabnk.convert(str(path), lazy_thresh_mb=0, store_dir=None)
+
+    assert sorted(p.name for p in path.parent.iterdir()) == ["gdp.csv"]
+    assert_frame_equal(panel.collect(), expected)
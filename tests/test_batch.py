@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+import dtabnk
+
+
+def write_csv(path):
+    lines = ['"Country Name","Country Code","Series Name","Series Code","2000 [YR2000]","2001 [YR2001]"']
+    for country in ("Aruba", "Chad"):
+        lines.append('"{}","{}","GDP (current US$)","NY.GDP.MKTP.CD",1.5,..'.format(
+            country, country[:3].upper()
+        ))
+    lines.extend(["", '"Data from database: World Development Indicators"'])
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_failed_export_format_fails_the_batch(tmp_path, monkeypatch, capsys):
+    pytest.importorskip("numpy")
+    for name in ("bad", "good"):
+        write_csv(tmp_path / "{}.csv".format(name))
+
+    write_sav_stream = dtabnk.write_sav_stream
+
+    def failing_sav(source, output_path, *args, **kwargs):
+        if output_path.endswith("bad.sav"):
+            raise OSError("disk full")
+        return write_sav_stream(source, output_path, *args, **kwargs)
+
+    monkeypatch.setattr(dtabnk, "write_sav_stream", failing_sav)
+
+    with pytest.raises(SystemExit) as exit_info:
+        dtabnk.main(["--batch", str(tmp_path), "--sav", "--no-cache", "--no-calibrate"])
+    assert exit_info.value.code == 1
+    assert "1 converted, 1 failed" in capsys.readouterr().out
+
+    with open(tmp_path / dtabnk.BATCH_MANIFEST_FILE, encoding="utf-8") as handle:
+        files = {
+            os.path.basename(key): entry
+            for key, entry in json.load(handle)["files"].items()
+        }
+    assert files["bad.csv"]["status"] == "failed"
+    assert files["bad.csv"]["error_type"] == "MissingOutput"
+    assert "bad.sav" in files["bad.csv"]["error"]
+    assert files["good.csv"]["status"] == "done"
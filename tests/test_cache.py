@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import dtabnk
+
+CSV = (
+    '"Country Name","Country Code","Series Name","Series Code","2000 [YR2000]","2001 [YR2001]"\n'
+    '"Aruba","ABW","GDP (current US$)","NY.GDP.MKTP.CD",1.5,..\n'
+    '"Chad","TCD","GDP (current US$)","NY.GDP.MKTP.CD",2.5,3.5\n'
+)
+
+
+@pytest.fixture
+def run(tmp_path, capsys):
+    source = tmp_path / "gdp.csv"
+    source.write_text(CSV)
+    cache_dir = tmp_path / "cache"
+
+    def convert(*extra):
+        capsys.readouterr()
+        dtabnk.main(
+            [str(source), "--overwrite", "--no-calibrate", "--cache-dir", str(cache_dir)]
+            + list(extra)
+        )
+        return capsys.readouterr().out
+
+    convert.source = source
+    convert.entries = lambda: sorted(os.listdir(cache_dir / "outputs"))
+    return convert
+
+
+def test_cache_key_tracks_options_and_input(run):
+    dta = "{}.dta".format(os.path.splitext(str(run.source))[0])
+
+    assert "Reused" not in run()
+    assert "Reused cached {}".format(dta) in run()
+
+    out = run("--stata", "14")
+    assert "Reused cached panel" in out
+    assert "Reused cached {}".format(dta) not in out
+
+    assert "Reused" not in run("--layout", "wide")
+    assert len(run.entries()) == 2
+
+    run.source.write_text(CSV.replace("3.5", "4.5"))
+    assert "Reused" not in run()
+    assert len(run.entries()) == 3
+
+
+def test_cache_hit_refreshes_recency(run):
+    run()
+    (entry,) = run.entries()
+    entry_dir = os.path.join(os.path.dirname(str(run.source)), "cache", "outputs", entry)
+    os.utime(entry_dir, (1, 1))
+
+    run()
+
+    assert os.path.getmtime(entry_dir) > 1
+
+
+def test_evict_cache_drops_least_recently_used(tmp_path):
+    for i, name in enumerate(["old", "mid", "new"]):
+        entry = tmp_path / name
+        entry.mkdir()
+        (entry / "panel.parquet").write_bytes(b"\0" * 512 * 1024)
+        os.utime(entry, (1000 + i, 1000 + i))
+
+    dtabnk.evict_cache(str(tmp_path), 1)
+
+    assert sorted(os.listdir(tmp_path)) == ["mid", "new"]
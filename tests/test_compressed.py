@@ -0,0 +1,69 @@
+import argparse
+import gzip
+import io
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import dtabnk
+
+
+@pytest.mark.parametrize(
+    "path, base",
+    [
+        ("data/x.csv", "data/x"),
+        ("data/x.csv.gz", "data/x"),
+        ("data/x.CSV.XZ", "data/x"),
+        ("data/x.csv.zst", "data/x"),
+        ("data/x.zip", "data/x"),
+        ("data/x.xlsx", "data/x"),
+        ("data/x.tar.gz", "data/x.tar"),
+    ],
+)
+def test_output_base_strips_compression_and_inner_csv(path, base):
+    assert dtabnk.output_base(path) == base
+
+
+def test_inputs_sharing_an_output_base_are_rejected():
+    files = ["x.csv.gz", "x.csv.xz"]
+    args = argparse.Namespace(files=files, sheets=None)
+    with pytest.raises(ValueError, match="would both write to x"):
+        dtabnk.plan_conversions(args, [dtabnk.output_base(f) for f in files], ["dta"])
+
+
+def wdi_csv(rows: int) -> bytes:
+    header = b"Country Name,Note,Value\n"
+    body = b"".join(b'"C%d","first\nsecond %d",%d\n' % (i, i, i) for i in range(rows))
+    footer = b"\nData from database: World Development Indicators\nLast Updated: 01/01/2024\n"
+    return header + body + footer
+
+
+def test_quoted_newlines_survive_chunk_cuts(tmp_path, monkeypatch):
+    monkeypatch.setattr(dtabnk, "FRAMING_HEAD_BYTES", 1024)
+    data = wdi_csv(5000)
+    expected = pl.read_csv(data.split(b"\n\nData")[0] + b"\n", infer_schema_length=0)
+    target = tmp_path / "parts"
+
+    _, rows = dtabnk.stream_csv_to_parquet(
+        io.BytesIO(data), str(target), ",", None, chunk_bytes=1000
+    )
+
+    assert rows == 5000
+    assert len(list(target.iterdir())) > 1
+    assert_frame_equal(pl.read_parquet(str(target / "*.parquet")), expected)
+
+
+def test_small_compressed_input_reads_eagerly(tmp_path):
+    path = tmp_path / "x.csv.gz"
+    path.write_bytes(gzip.compress(wdi_csv(50)))
+
+    frame, temp_path, policy = dtabnk.read_source(
+        str(path), None, None, False, ",", None
+    )
+
+    assert isinstance(frame, pl.DataFrame)
+    assert temp_path is None
+    assert policy["branch"] == "eager compressed CSV"
+    assert frame.height == 50
+    assert frame["Note"][49] == "first\nsecond 49"
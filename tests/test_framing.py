@@ -0,0 +1,50 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import dtabnk
+
+CSV = (
+    b"Country Name,Note,2020\n"
+    b'"Aruba","line one\nline two",1.5\n'
+    b"\n"
+    b'"Chad","a ""quoted"" word",2.5\n'
+    b'"Peru","x\n\ny",3.5\n'
+    b"\n"
+    b"Data from database: World Development Indicators\n"
+    b"Last Updated: 01/01/2024\n"
+)
+
+
+def test_framing_counts_records_not_lines(tmp_path):
+    path = tmp_path / "x.csv"
+    path.write_bytes(CSV)
+
+    skip_rows, data_end, n_rows, footer_filter = dtabnk.get_csv_framing(
+        str(path), ",", None
+    )
+
+    assert skip_rows == 0
+    assert CSV[data_end:].startswith(b"\nData from database")
+    assert n_rows == 4
+    assert not footer_filter
+
+
+@pytest.mark.parametrize("lazy_thresh_mb", [None, 0])
+def test_framed_read_keeps_quoted_newlines(tmp_path, lazy_thresh_mb):
+    path = tmp_path / "x.csv"
+    path.write_bytes(CSV)
+
+    frame, _, _ = dtabnk.read_source(
+        str(path), lazy_thresh_mb, None, False, ",", None
+    )
+    frame = dtabnk.collect_frame(frame)
+
+    expected = pl.DataFrame(
+        {
+            "Country Name": ["Aruba", None, "Chad", "Peru"],
+            "Note": ["line one\nline two", None, 'a "quoted" word', "x\n\ny"],
+            "2020": [1.5, None, 2.5, 3.5],
+        }
+    )
+    assert_frame_equal(frame, expected)
@@ -0,0 +1,54 @@
+import os
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import dtabnk
+
+
+def long_frame(categorical):
+    rows = []
+    for year in (2001, 2000, 2002):
+        for e in range(40):
+            for s in ("GDP", "Population", "CO2"):
+                rows.append(("Economy {}".format(e), year, s, e * 1.5 + year - 2000))
+    # A series that only one economy reports, so most shards lack it.
+    rows.append(("Economy 7", 2000, "Rare series", 9.0))
+    rows.append(("Economy 3", 2001, None, 4.0))
+    frame = pl.DataFrame(
+        rows, schema=["Country", "Year", "Series", "Value"], orient="row"
+    ).with_columns(pl.col("Year").cast(pl.Int16))
+    if categorical:
+        frame = frame.with_columns(pl.col("Country", "Series").cast(pl.Categorical))
+    return frame
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+@pytest.mark.parametrize("lazy_result", [False, True])
+def test_partitioned_pivot_matches_eager(tmp_path, monkeypatch, categorical, lazy_result):
+    frame = long_frame(categorical)
+    expected = dtabnk.pivot_eager(frame, ["Country", "Year"], "Series", "Value")
+
+    monkeypatch.setattr(dtabnk, "pivot_budget_mb", lambda *args: 1)
+    monkeypatch.setattr(dtabnk, "DEFAULT_EXPORT_BATCH_BYTES", 2048)
+    temp_paths = [] if lazy_result else None
+    result = dtabnk.pivot_partitioned(
+        frame.lazy(),
+        index=["Country", "Year"],
+        columns="Series",
+        values="Value",
+        est_bytes=64 * 1024 * 1024,
+        min_free_ram_mb=0,
+        safe_mode=False,
+        spill_dir=str(tmp_path),
+        temp_paths=temp_paths,
+    )
+
+    if lazy_result:
+        assert isinstance(result, pl.LazyFrame)
+        assert len(temp_paths) == 1
+        result = result.collect()
+        dtabnk.remove_temp_file(temp_paths[0])
+    assert_frame_equal(result, expected)
+    assert os.listdir(tmp_path) == []
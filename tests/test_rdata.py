@@ -0,0 +1,57 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import dtabnk
+
+pyreadr = pytest.importorskip("pyreadr")
+
+
+@pytest.mark.parametrize("compression", ["gzip", "xz"])
+def test_rdata_round_trip(tmp_path, monkeypatch, compression):
+    monkeypatch.setattr(dtabnk, "RDATA_CHUNK_ROWS", 7)
+    rows = 100
+    frame = pl.DataFrame(
+        {
+            "Country": pl.Series(
+                [None if i % 13 == 0 else "C{}".format(i % 5) for i in range(rows)],
+                dtype=pl.Categorical,
+            ),
+            "Region": pl.Series(
+                ["South", "North"] * (rows // 2), dtype=pl.Enum(["South", "North"])
+            ),
+            "Year": [1960 + i for i in range(rows)],
+            "Value": [None if i % 7 == 0 else i * 1.5 for i in range(rows)],
+            "Flag": [None if i % 11 == 0 else i % 2 == 0 for i in range(rows)],
+            "Note": [None if i % 3 == 0 else "n{}".format(i) for i in range(rows)],
+        }
+    )
+    path = tmp_path / "out.rdata"
+
+    assert dtabnk.write_rdata_native(frame, str(path), compression=compression) == rows
+
+    assert path.read_bytes()[:2] == (b"\x1f\x8b" if compression == "gzip" else b"\xfd7")
+    data = pyreadr.read_r(str(path))["df"]
+    assert list(data["Country"].cat.categories) == ["C0", "C1", "C2", "C3", "C4"]
+    result = pl.from_pandas(data).with_columns(
+        pl.col("Country", "Region").cast(pl.Utf8)
+    )
+    expected = frame.with_columns(
+        pl.col("Country", "Region").cast(pl.Utf8), pl.col("Year").cast(pl.Int32)
+    )
+    assert_frame_equal(result, expected)
+
+
+def test_rdata_keeps_enum_level_order(tmp_path):
+    rdata = pytest.importorskip("rdata")
+    levels = ["South", "North"]
+    frame = pl.DataFrame(
+        {"Region": pl.Series(["North", "South"], dtype=pl.Enum(levels))}
+    )
+    path = tmp_path / "out.rdata"
+
+    dtabnk.write_rdata_native(frame, str(path))
+
+    region = rdata.read_rda(str(path))["df"]["Region"]
+    assert list(region.cat.categories) == levels
+    assert list(region) == ["North", "South"]
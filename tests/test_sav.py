@@ -0,0 +1,39 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import dtabnk
+
+pyreadstat = pytest.importorskip("pyreadstat")
+
+
+def panel(rows: int) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "Country": [
+                "Côte d'Ivoire" if i % 3 else "C" * (i % 200 + 1) for i in range(rows)
+            ],
+            "Year": [1960 + i % 60 for i in range(rows)],
+            "Small": [i % 200 - 100 for i in range(rows)],
+            "Value": [None if i % 7 == 0 else i * 1.25 - 1e6 for i in range(rows)],
+            "Flag": [i % 2 == 0 for i in range(rows)],
+        }
+    )
+
+
+@pytest.mark.parametrize("zsav", [False, True])
+def test_sav_round_trip(tmp_path, zsav):
+    frame = panel(1000)
+    path = tmp_path / ("out.zsav" if zsav else "out.sav")
+
+    rows = dtabnk.write_sav_stream(frame.lazy(), str(path), zsav=zsav, batch_bytes=512)
+
+    data, meta = pyreadstat.read_sav(str(path))
+    assert rows == 1000
+    assert path.read_bytes()[:4] == (b"$FL3" if zsav else b"$FL2")
+    assert meta.number_rows == 1000
+    assert meta.column_names == frame.columns
+    assert_frame_equal(
+        pl.from_pandas(data),
+        frame.with_columns(pl.col("Year", "Small", "Flag").cast(pl.Float64)),
+    )
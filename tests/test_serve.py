@@ -0,0 +1,71 @@
+import os
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+
+import dtabnk
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="the daemon needs Unix sockets"
+)
+
+
+def write_csv(path):
+    lines = ['"Country Name","Country Code","Series Name","Series Code","2000 [YR2000]","2001 [YR2001]"']
+    for country in ("Aruba", "Chad"):
+        lines.append('"{}","{}","GDP (current US$)","NY.GDP.MKTP.CD",1.5,..'.format(
+            country, country[:3].upper()
+        ))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_serve_connect_round_trip(tmp_path):
+    socket_path = str(tmp_path / "d.sock")
+    source = tmp_path / "wdi.csv"
+    write_csv(source)
+    daemon = subprocess.Popen(
+        [sys.executable, dtabnk.__file__, "--serve", "--socket", socket_path, "--jobs", "1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 60
+        while not os.path.exists(socket_path):
+            assert daemon.poll() is None and time.time() < deadline
+            time.sleep(0.1)
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+        for out in ("first", "second"):
+            status = dtabnk.forward_to_daemon(
+                socket_path,
+                [str(source), "--out", str(tmp_path / out), "--no-cache", "--no-calibrate"],
+            )
+            assert status == 0
+            assert (tmp_path / "{}.dta".format(out)).exists()
+    finally:
+        daemon.send_signal(signal.SIGTERM)
+        daemon.wait(timeout=30)
+    assert not os.path.exists(socket_path)
+
+
+def test_serve_job_resets_per_job_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / "wdi.csv"
+    write_csv(source)
+    common = [str(source), "--overwrite", "--cache-dir", str(tmp_path / "cache")]
+
+    first = dtabnk.serve_job(common + ["--profile", str(tmp_path / "p.json")], str(tmp_path))
+    assert first["exit"] == 0
+    assert dtabnk.PROFILE_STATE["records"]
+    assert dtabnk.MEMORY_MODEL["path"]
+
+    second = dtabnk.serve_job(common + ["--no-calibrate"], str(tmp_path))
+    assert second["exit"] == 0
+    assert dtabnk.PROFILE_STATE["records"] is None
+    assert dtabnk.MEMORY_MODEL["path"] is None
+    assert dtabnk.MEMORY_MODEL["pending"] == {}
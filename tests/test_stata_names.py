@@ -0,0 +1,54 @@
+import pytest
+
+import dtabnk
+
+pyreadstat = pytest.importorskip("pyreadstat")
+
+LONG_SERIES = [
+    "Access to clean fuels and technologies for cooking (% of population)",
+    "Access to clean fuels and technologies for cooking, rural (% of rural population)",
+    "GDP (current US$)",
+]
+
+
+def write_wide_csv(path):
+    lines = ['"Country Name","Country Code","Series Name","Series Code","2000 [YR2000]","2001 [YR2001]"']
+    for country in ("Aruba", "Chad"):
+        for j, series in enumerate(LONG_SERIES):
+            lines.append(
+                '"{}","{}","{}","S.{}",{}.5,..'.format(country, country[:3].upper(), series, j, j)
+            )
+    lines.extend(["", '"Data from database: World Development Indicators"'])
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@pytest.mark.parametrize("stata", [11, 13, 15])
+def test_long_indicator_names_are_shortened_and_labelled(tmp_path, stata):
+    source = tmp_path / "wdi.csv"
+    write_wide_csv(source)
+    base = tmp_path / "out"
+
+    dtabnk.main(
+        [
+            str(source),
+            "--out",
+            str(base),
+            "--stata",
+            str(stata),
+            "--no-cache",
+            "--no-calibrate",
+        ]
+    )
+
+    df, meta = pyreadstat.read_dta("{}.dta".format(base))
+    names = list(df.columns)
+    full = dtabnk.sanitise(LONG_SERIES)
+
+    assert len(names) == len(set(names)) == 5
+    assert all(len(name) <= dtabnk.STATA_MAX_NAME for name in names)
+    assert names[:2] == ["Country", "Year"]
+    assert "GDP_current_USD" in names
+    labels = dict(zip(meta.column_names, meta.column_labels))
+    assert labels["GDP_current_USD"] in (None, "")
+    assert sorted(labels[name] for name in names[2:] if labels[name]) == sorted(full[:2])
+    assert df.shape == (4, 5)
@@ -0,0 +1,62 @@
+import polars as pl
+from polars.testing import assert_frame_equal
+
+import dtabnk
+
+SERIES = [("GDP (current US$)", "NY.GDP"), ("Population, total", "SP.POP")]
+
+
+def write_csv(path, countries, years):
+    lines = [
+        ",".join(
+            ['"Country Name"', '"Country Code"', '"Series Name"', '"Series Code"']
+            + ['"{0} [YR{0}]"'.format(year) for year in years]
+        )
+    ]
+    for i, country in enumerate(countries):
+        for j, (name, code) in enumerate(SERIES):
+            values = [str(round(i * 10 + j + (year - 2000) * 0.5, 2)) for year in years]
+            lines.append(
+                ",".join(
+                    [
+                        '"{}"'.format(country),
+                        country[:3].upper(),
+                        '"{}"'.format(name),
+                        code,
+                    ]
+                    + values
+                )
+            )
+    lines.extend(["", '"Data from database: World Development Indicators"'])
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def convert(source, out, capsys, *extra):
+    capsys.readouterr()
+    dtabnk.main(
+        [str(source), "--out", str(out), "--parquet-out", "--overwrite"]
+        + ["--no-cache", "--no-calibrate"]
+        + list(extra)
+    )
+    return capsys.readouterr().out
+
+
+def test_update_deltas_match_a_full_conversion(tmp_path, capsys):
+    source = tmp_path / "wdi.csv"
+    write_csv(source, ["Aruba", "Chad"], [2000, 2001])
+    assert "in full" in convert(source, tmp_path / "panel", capsys, "--update")
+
+    steps = [
+        (["Aruba", "Chad"], [2000, 2001, 2002]),
+        (["Aruba", "Chad", "Peru"], [2000, 2001, 2002]),
+    ]
+    for countries, years in steps:
+        write_csv(source, countries, years)
+        out = convert(source, tmp_path / "panel", capsys, "--update")
+        assert "in full" not in out and "No new data" not in out
+
+        convert(source, tmp_path / "full", capsys)
+        assert_frame_equal(
+            pl.read_parquet(tmp_path / "panel.parquet"),
+            pl.read_parquet(tmp_path / "full.parquet"),
+        )